@@ -1,7 +1,11 @@
+import hashlib
+import io
+import json
+import os
 import re
 import sys
+from concurrent.futures import ProcessPoolExecutor
 
-errors_encounter = 0
 pattern = re.compile(
 	r"_\(([\"']{,3})(?P<message>((?!\1).)*)\1(\s*,\s*context\s*=\s*([\"'])(?P<py_context>((?!\5).)*)\5)*(\s*,(\s*?.*?\n*?)*(,\s*([\"'])(?P<js_context>((?!\11).)*)\11)*)*\)"
 )
@@ -9,60 +13,170 @@ words_pattern = re.compile(r"_{1,2}\([\"'`]{1,3}.*?[a-zA-Z]")
 start_pattern = re.compile(r"_{1,2}\([f\"'`]{1,3}")
 f_string_pattern = re.compile(r"_\(f[\"']")
 starts_with_f_pattern = re.compile(r"_\(f")
+non_space_pattern = re.compile(r"\S")
 
-# skip first argument
-files = sys.argv[1:]
-files_to_scan = [_file for _file in files if _file.endswith((".py", ".js"))]
+# Cached results are dropped whenever the patterns change
+LINTER_VERSION = hashlib.sha256(
+	"".join(
+		p.pattern for p in (pattern, words_pattern, start_pattern, f_string_pattern, starts_with_f_pattern)
+	).encode()
+).hexdigest()[:12]
+CACHE_FILE = os.getenv("TRANSLATION_LINT_CACHE", ".translation-lint-cache.json")
 
-for _file in files_to_scan:
-	with open(_file, "r") as f:
+
+def strip_from(content, pos):
+	"""Same as content[pos:].strip()[:100] without copying the rest of the file."""
+	match = non_space_pattern.search(content, pos)
+	if not match:
+		return ""
+	start = match.start()
+	if non_space_pattern.search(content, start + 99):
+		return content[start : start + 100]
+	return content[start : start + 100].rstrip()
+
+
+def scan(content):
+	"""
+	Scans file content once and returns (messages, error count).
+	Multiline calls are matched in place with pos instead of joining the rest of the file.
+	"""
+	messages = []
+	errors = 0
+	offset = 0
+	# Lines end at \n only, like the line numbers of editors and of the old linter
+	for line_number, line in enumerate(io.StringIO(content).readlines(), 1):
+		line_offset = offset
+		offset += len(line)
+
+		# every start_pattern match contains "_(", skip the regexes for most lines
+		if "_(" not in line or "frappe-lint: disable-translate" in line:
+			continue
+
+		start_matches = start_pattern.search(line)
+		if not start_matches:
+			continue
+
+		if starts_with_f_pattern.search(line):
+			if f_string_pattern.search(line):
+				errors += 1
+				messages.append(
+					f"\nF-strings are not supported for translations at line number {line_number}\n{line.strip()[:100]}"
+				)
+			continue
+
+		match = pattern.search(line)
+		error_found = False
+		multiline_pos = None
+
+		if not match and line.endswith((",\n", "[\n")):
+			# validate multiline pattern against the remaining text
+			multiline_pos = line_offset + start_matches.start() + 1
+			match = pattern.match(content, multiline_pos)
+
+		if multiline_pos is None:
+			has_words = words_pattern.search(line)
+			snippet = line.strip()[:100]
+		else:
+			has_words = words_pattern.search(content, multiline_pos)
+			snippet = strip_from(content, multiline_pos)
+
+		if not match:
+			error_found = True
+			messages.append(f"\nTranslation syntax error at line number {line_number}\n{snippet}")
+
+		if not error_found and not has_words:
+			error_found = True
+			messages.append(
+				f"\nTranslation is useless because it has no words at line number {line_number}\n{snippet}"
+			)
+
+		if error_found:
+			errors += 1
+
+	return messages, errors
+
+
+def scan_file(path):
+	"""Returns (path, content hash, messages, error count)."""
+	with open(path, "r") as f:
+		content = f.read()
+	digest = hashlib.sha256(content.encode()).hexdigest()
+	messages, errors = scan(content)
+	return path, digest, messages, errors
+
+
+def file_digest(path):
+	with open(path, "r") as f:
+		return hashlib.sha256(f.read().encode()).hexdigest()
+
+
+def load_cache(path):
+	try:
+		with open(path) as f:
+			cache = json.load(f)
+	except (OSError, ValueError):
+		return {}
+	if cache.get("version") != LINTER_VERSION:
+		return {}
+	return cache.get("files", {})
+
+
+def save_cache(path, files):
+	tmp_path = f"{path}.tmp"
+	with open(tmp_path, "w") as f:
+		json.dump({"version": LINTER_VERSION, "files": files}, f)
+	os.replace(tmp_path, path)
+
+
+def lint(files_to_scan, cache_file=CACHE_FILE, jobs=None):
+	"""Returns {path: (messages, error count)} for every file, scanning only changed ones."""
+	cache = load_cache(cache_file) if cache_file else {}
+	results = {}
+	to_scan = []
+	for path in files_to_scan:
+		cached = cache.get(path)
+		if cached and cached["hash"] == file_digest(path):
+			results[path] = (cached["messages"], cached["errors"])
+		else:
+			to_scan.append(path)
+
+	# starting a process pool costs more than scanning a handful of files
+	if len(to_scan) > 8 and jobs != 1:
+		with ProcessPoolExecutor(max_workers=jobs) as executor:
+			scanned = list(executor.map(scan_file, to_scan, chunksize=8))
+	else:
+		scanned = [scan_file(path) for path in to_scan]
+
+	for path, digest, messages, errors in scanned:
+		results[path] = (messages, errors)
+		cache[path] = {"hash": digest, "messages": messages, "errors": errors}
+
+	if cache_file and scanned:
+		save_cache(cache_file, cache)
+	return results
+
+
+def main(files):
+	files_to_scan = [_file for _file in files if _file.endswith((".py", ".js"))]
+	results = lint(files_to_scan)
+
+	errors_encounter = 0
+	for _file in files_to_scan:
 		print(f"Checking: {_file}")
-		file_lines = f.readlines()
-		for line_number, line in enumerate(file_lines, 1):
-			if "frappe-lint: disable-translate" in line:
-				continue
-
-			start_matches = start_pattern.search(line)
-			if start_matches:
-				starts_with_f = starts_with_f_pattern.search(line)
-
-				if starts_with_f:
-					has_f_string = f_string_pattern.search(line)
-					if has_f_string:
-						errors_encounter += 1
-						print(
-							f"\nF-strings are not supported for translations at line number {line_number}\n{line.strip()[:100]}"
-						)
-						continue
-					else:
-						continue
-
-				match = pattern.search(line)
-				error_found = False
-
-				if not match and line.endswith((",\n", "[\n")):
-					# concat remaining text to validate multiline pattern
-					line = "".join(file_lines[line_number - 1 :])
-					line = line[start_matches.start() + 1 :]
-					match = pattern.match(line)
-
-				if not match:
-					error_found = True
-					print(f"\nTranslation syntax error at line number {line_number}\n{line.strip()[:100]}")
-
-				if not error_found and not words_pattern.search(line):
-					error_found = True
-					print(
-						f"\nTranslation is useless because it has no words at line number {line_number}\n{line.strip()[:100]}"
-					)
-
-				if error_found:
-					errors_encounter += 1
-
-if errors_encounter > 0:
-	print(
-		'\nVisit "https://frappeframework.com/docs/user/en/translations" to learn about valid translation strings.'
-	)
-	sys.exit(1)
-else:
+		messages, errors = results[_file]
+		for message in messages:
+			print(message)
+		errors_encounter += errors
+
+	if errors_encounter > 0:
+		print(
+			'\nVisit "https://frappeframework.com/docs/user/en/translations" to learn about valid translation strings.'
+		)
+		return 1
 	print("\nGood To Go!")
+	return 0
+
+
+if __name__ == "__main__":
+	# skip first argument
+	sys.exit(main(sys.argv[1:]))
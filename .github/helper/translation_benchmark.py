@@ -0,0 +1,57 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import translation  # noqa: E402
+
+SNIPPETS = (
+	'\tfrappe.msgprint(__("Saved {0} records", [count]));\n',
+	"\tconst label = __('Customer');\n",
+	"\tfrappe.throw(_(\"Not allowed\"), frappe.PermissionError)\n",
+	'\tfrappe.throw(_(f"Bad {value}"))\n',
+	"\tconst empty = __('');\n",
+	'\tfrappe.msgprint(__("Line one and a very long message that continues",\n\t\t[value],\n\t\t"context"));\n',
+	'\tfrappe.msgprint(_("Multiline call with arguments {0}",\n\t\t[doc.name]))\n',
+	"\tconst x = compute(a, b, c);\n",
+	"\t// frappe-lint: disable-translate __('')\n",
+	"\treturn __(\"Ready\", null, \"Status\");\n",
+)
+
+
+def generate_corpus(path, files=200, lines=2000, seed=0):
+	"""Writes a reproducible corpus of .js and .py files and returns their paths."""
+	rng = random.Random(seed)
+	paths = []
+	for i in range(files):
+		file_path = os.path.join(path, f"file_{i}.{'js' if i % 2 else 'py'}")
+		with open(file_path, "w") as f:
+			f.write("".join(rng.choice(SNIPPETS) for _ in range(lines)))
+		paths.append(file_path)
+	return paths
+
+
+def timed(func, *args, **kwargs):
+	start = time.perf_counter()
+	func(*args, **kwargs)
+	return time.perf_counter() - start
+
+
+def main():
+	files = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+	lines = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+	with tempfile.TemporaryDirectory() as path:
+		paths = generate_corpus(path, files, lines)
+		cache_file = os.path.join(path, "cache.json")
+		print(f"Corpus: {files} files, {lines} lines each")
+		print(f"serial:        {timed(translation.lint, paths, cache_file=None, jobs=1):.2f}s")
+		print(f"process pool:  {timed(translation.lint, paths, cache_file=cache_file):.2f}s")
+		print(f"cached:        {timed(translation.lint, paths, cache_file=cache_file):.2f}s")
+	return 0
+
+
+if __name__ == "__main__":
+	sys.exit(main())
@@ -6,16 +6,38 @@ import os
 import re
 import subprocess
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Literal
 
 Repo = Literal["frappe", "erpnext"]
 MajorVersion = Literal["12", "13", "14", "15", "16", "develop"]
 
+REPOS = ["frappe", "erpnext"]
+VERSIONS = ["12", "13", "14", "15", "16", "develop"]
+CACHE_FILE = os.path.join(
+    os.getenv("XDG_CACHE_HOME", os.path.expanduser("~/.cache")),
+    "frappe_docker",
+    "refs.json",
+)
+TAG_REGEX = re.compile(r"^v(\d+)\.(\d+)\.(\d+)(-.*)?$")
+
+
+def version_key(tag: str):
+    # Same order as git's versionsort.suffix=-: pre-releases before the release
+    match = TAG_REGEX.match(tag)
+    if not match:
+        return (0, 0, 0, 0, (tag,))
+    major, minor, patch, suffix = match.groups()
+    # Numbers in the suffix compare as numbers too: -beta.2 before -beta.10
+    suffix_key = tuple(
+        int(part) if part.isdigit() else part
+        for part in re.split(r"(\d+)", suffix or "")
+    )
+    return (int(major), int(minor), int(patch), 0 if suffix else 1, suffix_key)
 
-def get_latest_tag(repo: Repo, version: MajorVersion) -> str:
-    if version == "develop":
-        return "develop"
-    regex = rf"v{version}.*"
+
+def fetch_tags(repo: Repo) -> list[str]:
     refs = subprocess.check_output(
         (
             "git",
@@ -26,18 +48,110 @@ def get_latest_tag(repo: Repo, version: MajorVersion) -> str:
             "--tags",
             "--sort=v:refname",
             f"https://github.com/frappe/{repo}",
-            str(regex),
+            "v*",
         ),
         encoding="UTF-8",
     ).split()[1::2]
-
-    if not refs:
-        raise RuntimeError(f'No tags found for version "{regex}"')
-    ref = refs[-1]
-    matches: list[str] = re.findall(regex, ref)
+    return [ref.removeprefix("refs/tags/") for ref in refs]
+
+
+def load_cache(path: str) -> dict[str, dict]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(path: str, cache: dict[str, dict]):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def get_tags(
+    repos: list[Repo],
+    cache_file: str | None = CACHE_FILE,
+    cache_ttl: float = 3600,
+    refs_file: str | None = None,
+) -> dict[str, list[str]]:
+    """
+    Returns tags of every repo. `refs_file` is a JSON fixture
+    {"frappe": [...], "erpnext": [...]} used instead of the network.
+    Otherwise fresh cache entries are used and the rest are fetched concurrently,
+    falling back to stale cache entries if fetching fails.
+    """
+    if refs_file:
+        with open(refs_file) as f:
+            refs = json.load(f)
+        return {repo: refs[repo] for repo in repos}
+
+    cache = load_cache(cache_file) if cache_file else {}
+    now = time.time()
+    tags = {
+        repo: cache[repo]["tags"]
+        for repo in repos
+        if repo in cache and now - cache[repo]["fetched"] < cache_ttl
+    }
+    missing = [repo for repo in repos if repo not in tags]
+    if not missing:
+        return tags
+
+    with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+        futures = {repo: executor.submit(fetch_tags, repo) for repo in missing}
+    for repo, future in futures.items():
+        try:
+            tags[repo] = future.result()
+        except (subprocess.CalledProcessError, OSError):
+            if repo not in cache:
+                raise
+            print(f"Can't fetch {repo} tags, using cached ones", file=sys.stderr)
+            tags[repo] = cache[repo]["tags"]
+        else:
+            cache[repo] = {"fetched": now, "tags": tags[repo]}
+
+    if cache_file:
+        save_cache(cache_file, cache)
+    return tags
+
+
+def find_latest_tag(tags: list[str], version: MajorVersion) -> str:
+    if version == "develop":
+        return "develop"
+    regex = rf"v{version}\..*"
+    matches = sorted((tag for tag in tags if re.fullmatch(regex, tag)), key=version_key)
     if not matches:
-        raise RuntimeError(f'Can\'t parse tag from ref "{ref}"')
-    return matches[0]
+        raise RuntimeError(f'No tags found for version "{regex}"')
+    return matches[-1]
+
+
+def get_latest_tag(repo: Repo, version: MajorVersion, **kwargs) -> str:
+    if version == "develop":
+        return "develop"
+    return find_latest_tag(get_tags([repo], **kwargs)[repo], version)
+
+
+def get_matrix(
+    repo: Repo, versions: list[MajorVersion], **kwargs
+) -> list[dict[str, str | None]]:
+    repos: list[Repo] = ["frappe", "erpnext"] if repo == "erpnext" else ["frappe"]
+    tags = get_tags(repos, **kwargs) if set(versions) - {"develop"} else {}
+    matrix: list[dict[str, str | None]] = []
+    for version in versions:
+        matrix.append(
+            {
+                "version": version,
+                "frappe": find_latest_tag(tags.get("frappe", []), version),
+                "erpnext": (
+                    find_latest_tag(tags.get("erpnext", []), version)
+                    if repo == "erpnext"
+                    else None
+                ),
+            }
+        )
+    return matrix
 
 
 def update_env(file_name: str, frappe_tag: str, erpnext_tag: str | None = None):
@@ -55,18 +169,44 @@ def _print_resp(frappe_tag: str, erpnext_tag: str | None = None):
 
 def main(_args: list[str]) -> int:
     parser = argparse.ArgumentParser()
-    parser.add_argument("--repo", choices=["frappe", "erpnext"], required=True)
+    parser.add_argument("--repo", choices=REPOS, required=True)
+    parser.add_argument(
+        "--version",
+        choices=VERSIONS,
+        nargs="+",
+        required=True,
+        help="Several versions print a JSON matrix instead",
+    )
     parser.add_argument(
-        "--version", choices=["12", "13", "14", "15", "16", "develop"], required=True
+        "--cache-file",
+        default=os.getenv("REFS_CACHE_FILE", CACHE_FILE),
+        help="Where fetched tags are cached",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=3600,
+        help="Seconds cached tags stay fresh, 0 to always fetch",
+    )
+    parser.add_argument(
+        "--refs-file",
+        default=os.getenv("REFS_FIXTURE"),
+        help='Read tags from JSON {"frappe": [...], "erpnext": [...]} offline',
     )
     args = parser.parse_args(_args)
 
-    frappe_tag = get_latest_tag("frappe", args.version)
-    if args.repo == "erpnext":
-        erpnext_tag = get_latest_tag("erpnext", args.version)
-    else:
-        erpnext_tag = None
+    matrix = get_matrix(
+        args.repo,
+        args.version,
+        cache_file=args.cache_file,
+        cache_ttl=args.cache_ttl,
+        refs_file=args.refs_file,
+    )
+    if len(matrix) > 1:
+        print(json.dumps(matrix))
+        return 0
 
+    frappe_tag, erpnext_tag = matrix[0]["frappe"], matrix[0]["erpnext"]
     file_name = os.getenv("GITHUB_ENV")
     if file_name:
         update_env(file_name, frappe_tag, erpnext_tag)
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import sys
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True)
+class Update:
+    path: str
+    pattern: str
+    value: str
+    # Add value as a new line if nothing matches
+    append: bool = False
+
+
+def env_var(path: str, name: str, value: str) -> Update:
+    return Update(path, rf"^{re.escape(name)}=.*$", f"{name}={value}", append=True)
+
+
+def apply_updates(content: str, updates: list[Update]) -> str:
+    for update in updates:
+        content, count = re.subn(
+            update.pattern, lambda _: update.value, content, flags=re.MULTILINE
+        )
+        if not count and update.append:
+            content += f"\n{update.value}"
+    return content
+
+
+def write_atomic(path: str, content: str):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def render(updates: list[Update], check: bool = False) -> list[str]:
+    """
+    Applies updates reading and writing every file once.
+    Only changed files are written, in check mode nothing is.
+    Returns paths of files that changed or would change.
+    """
+    by_path: dict[str, list[Update]] = {}
+    for update in updates:
+        by_path.setdefault(update.path, []).append(update)
+
+    changed: list[str] = []
+    for path, path_updates in by_path.items():
+        with open(path) as f:
+            content = f.read()
+        new_content = apply_updates(content, path_updates)
+        if new_content == content:
+            continue
+        changed.append(path)
+        if not check:
+            write_atomic(path, new_content)
+    return changed
+
+
+def get_versions():
+    erpnext_version = os.getenv("ERPNEXT_VERSION")
+    assert erpnext_version, "No ERPNext version set"
+    return erpnext_version
+
+
+def release_updates(erpnext_version: str) -> list[Update]:
+    return [
+        env_var("example.env", "ERPNEXT_VERSION", erpnext_version),
+        Update("pwd.yml", r"frappe/erpnext:.*", f"frappe/erpnext:{erpnext_version}"),
+    ]
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Update example.env and pwd.yml to ERPNEXT_VERSION"
+    )
+    parser.add_argument(
+        "--check",
+        action="store_true",
+        help="Don't write, exit with 1 if files are out of date",
+    )
+    args = parser.parse_args(_args)
+
+    changed = render(release_updates(get_versions()), check=args.check)
+    for path in changed:
+        print(f"{'Outdated' if args.check else 'Updated'}: {path}")
+    return 1 if args.check and changed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,7 +1,16 @@
 #!/usr/bin/env python3
 import argparse
+import ast
+import glob
+import hashlib
+import json
 import os
+import platform
+import re
 import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 
 def cprint(*args, level: int = 1):
@@ -26,11 +35,83 @@ def cprint(*args, level: int = 1):
         print(CYLW, message, reset)  # noqa: T001, T201
 
 
+STEP_TIMINGS = []
+_step_timings_lock = threading.Lock()
+
+
+def run_step(name: str, command: list, check: bool = False, **kwargs):
+    """
+    runs command like subprocess.call and records wall time,
+    cpu time and peak rss of the child process in STEP_TIMINGS
+    """
+    start = time.monotonic()
+    process = subprocess.Popen(command, **kwargs)
+    _, status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(status)
+    timing = {
+        "step": name,
+        "command": " ".join(map(str, command)),
+        "wall_time": round(time.monotonic() - start, 3),
+        "cpu_time": round(usage.ru_utime + usage.ru_stime, 3),
+        # ru_maxrss is in kilobytes on linux
+        "peak_rss_mb": round(usage.ru_maxrss / 1024, 1),
+        "returncode": process.returncode,
+    }
+    with _step_timings_lock:
+        STEP_TIMINGS.append(timing)
+    if check and process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, command)
+    return process.returncode
+
+
+def print_step_timings():
+    cprint("Step timings:", level=2)
+    cprint(f"{'step':<50}{'wall s':>10}{'cpu s':>10}{'rss MB':>10}", level=3)
+    for timing in sorted(STEP_TIMINGS, key=lambda t: t["wall_time"], reverse=True):
+        cprint(
+            f"{timing['step'][:49]:<50}{timing['wall_time']:>10.1f}"
+            f"{timing['cpu_time']:>10.1f}{timing['peak_rss_mb']:>10.1f}",
+            level=1 if timing["returncode"] else 3,
+        )
+
+
+def write_step_timings(args, wall_time: float):
+    report = {
+        "frappe_repo": args.frappe_repo,
+        "frappe_branch": args.frappe_branch,
+        "bench_name": args.bench_name,
+        "python": platform.python_version(),
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "wall_time": round(wall_time, 3),
+        "steps": STEP_TIMINGS,
+    }
+    path = args.timing_report
+    if not path:
+        if not os.path.isdir(args.bench_name):
+            cprint("No bench, timing report not written", level=3)
+            return
+        # kept out of the working directory, which is usually the repo
+        path = os.path.join(args.bench_name, "installer-timings.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2)
+    cprint(f"Timing report written to {path}", level=2)
+
+
 def main():
     parser = get_args_parser()
     args = parser.parse_args()
-    init_bench_if_not_exist(args)
-    create_site_in_bench(args)
+    if args.config_dry_run:
+        bench_created = not os.path.exists(args.bench_name)
+        print_config_plan(get_config_plan(args, bench_created))
+        return
+    start = time.monotonic()
+    try:
+        bench_created = init_bench_if_not_exist(args)
+        apply_config_plan(args, get_config_plan(args, bench_created))
+        create_site_in_bench(args)
+    finally:
+        print_step_timings()
+        write_step_timings(args, time.monotonic() - start)
 
 
 def get_args_parser():
@@ -113,97 +194,322 @@ def get_args_parser():
         help="Database type to use (e.g., mariadb or postgres)",
         default="mariadb",  # Set your default database type here
     )
+    parser.add_argument(
+        "--parallel-apps",
+        action="store_true",
+        help="init frappe alone, then fetch apps from apps.json concurrently",  # noqa: E501
+    )
+    parser.add_argument(
+        "--jobs",
+        action="store",
+        type=int,
+        help="number of apps fetched concurrently with --parallel-apps, default: 4",  # noqa: E501
+        default=4,
+    )
+    parser.add_argument(
+        "--config-dry-run",
+        action="store_true",
+        help="print common_site_config.json changes and exit",  # noqa: E501
+    )
+    parser.add_argument(
+        "--sites",
+        action="store",
+        type=str,
+        nargs="+",
+        help="create several sites with all bench apps, overrides --site-name",  # noqa: E501
+        default=None,
+    )
+    parser.add_argument(
+        "--sites-manifest",
+        action="store",
+        type=str,
+        help='json list of {"site_name": ..., "apps": [...]} to create',  # noqa: E501
+        default=None,
+    )
+    parser.add_argument(
+        "--site-jobs",
+        action="store",
+        type=int,
+        help="number of sites created concurrently, default: 2",  # noqa: E501
+        default=2,
+    )
+    parser.add_argument(
+        "--site-template",
+        action="store_true",
+        help="create sites by restoring a cached, fully installed template site",  # noqa: E501
+    )
+    parser.add_argument(
+        "--timing-report",
+        action="store",
+        type=str,
+        help="path of json step timing report, default: <bench>/installer-timings.json",  # noqa: E501
+        default=None,
+    )
     return parser
 
 
+def get_shell_command(args, command: str):
+    """
+    wraps command in an interactive bash so nvm and pyenv are available
+    """
+    shell_command = ""
+    if args.node_version:
+        shell_command = f"nvm use {args.node_version};"
+    if args.py_version:
+        shell_command += f"PYENV_VERSION={args.py_version} "
+    shell_command += command
+    return [
+        "/bin/bash",
+        "-i",
+        "-c",
+        shell_command,
+    ]
+
+
 def init_bench_if_not_exist(args):
+    """
+    returns True if a new bench was initialised
+    exits if bench init or fetching the apps failed
+    """
     if os.path.exists(args.bench_name):
         cprint("Bench already exists. Only site will be created", level=3)
-        return
+        return False
     try:
         env = os.environ.copy()
         if args.py_version:
             env["PYENV_VERSION"] = args.py_version
-        init_command = ""
-        if args.node_version:
-            init_command = f"nvm use {args.node_version};"
-        if args.py_version:
-            init_command += f"PYENV_VERSION={args.py_version} "
-        init_command += "bench init "
+        init_command = "bench init "
         init_command += "--skip-redis-config-generation "
         init_command += "--verbose " if args.verbose else " "
         init_command += f"--frappe-path={args.frappe_repo} "
         init_command += f"--frappe-branch={args.frappe_branch} "
-        init_command += f"--apps_path={args.apps_json} "
+        if args.parallel_apps:
+            # apps and assets are handled by fetch_apps_in_parallel
+            init_command += "--skip-assets "
+        else:
+            init_command += f"--apps_path={args.apps_json} "
         init_command += args.bench_name
-        command = [
-            "/bin/bash",
-            "-i",
-            "-c",
-            init_command,
-        ]
-        subprocess.call(command, env=env, cwd=os.getcwd())
-        cprint("Configuring Bench ...", level=2)
-        cprint("Set db_host", level=3)
+        command = get_shell_command(args, init_command)
+        run_step("bench init", command, check=True, env=env, cwd=os.getcwd())
+        if args.parallel_apps:
+            fetch_apps_in_parallel(args)
+    except subprocess.CalledProcessError as e:
+        # the bench is incomplete, it must not be configured or get sites
+        cprint(f"{' '.join(map(str, e.cmd))} failed with {e.returncode}", level=1)
+        raise SystemExit(e.returncode)
+    return True
+
+
+def get_db_host(args):
+    # Should match the compose service name
+    return "mariadb" if "mariadb" == args.db_type else "postgresql"
+
+
+def get_config_plan(args, bench_created: bool):
+    """
+    returns every common_site_config.json key the installer sets
+    an existing bench only gets db_host updated
+    """
+    plan = {}
+    if bench_created:
         if args.db_type:
-            cprint(f"Setting db_type to {args.db_type}", level=3)
-            subprocess.call(
-                ["bench", "set-config", "-g", "db_type", args.db_type],
-                cwd=os.path.join(os.getcwd(), args.bench_name),
-            )
-
-        cprint("Set redis_cache to redis://redis-cache:6379", level=3)
-        subprocess.call(
-            [
-                "bench",
-                "set-config",
-                "-g",
-                "redis_cache",
-                "redis://redis-cache:6379",
-            ],
-            cwd=os.getcwd() + "/" + args.bench_name,
-        )
-        cprint("Set redis_queue to redis://redis-queue:6379", level=3)
-        subprocess.call(
-            [
-                "bench",
-                "set-config",
-                "-g",
-                "redis_queue",
-                "redis://redis-queue:6379",
-            ],
-            cwd=os.getcwd() + "/" + args.bench_name,
+            plan["db_type"] = args.db_type
+        plan["redis_cache"] = "redis://redis-cache:6379"
+        plan["redis_queue"] = "redis://redis-queue:6379"
+        # for backward compatibility
+        plan["redis_socketio"] = "redis://redis-queue:6379"
+        plan["developer_mode"] = 1
+    plan["db_host"] = get_db_host(args)
+    return plan
+
+
+def print_config_plan(plan: dict):
+    cprint("common_site_config.json plan:", level=2)
+    for key, value in plan.items():
+        cprint(f"{key} = {json.dumps(value)}", level=3)
+
+
+def apply_config_plan(args, plan: dict):
+    """
+    applies the plan with a single atomic read-modify-write
+    instead of one bench set-config process per key
+    """
+    config_path = os.path.join(
+        os.getcwd(), args.bench_name, "sites", "common_site_config.json"
+    )
+    cprint("Configuring Bench ...", level=2)
+    config = {}
+    if os.path.exists(config_path):
+        with open(config_path) as f:
+            config = json.load(f)
+    for key, value in plan.items():
+        cprint(f"Set {key} to {value}", level=3)
+    config.update(plan)
+
+    tmp_path = f"{config_path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(config, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, config_path)
+
+
+def get_repo_name(url: str):
+    return url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+
+
+def get_app_name(app_path: str, default: str):
+    """
+    reads the python package name the same way bench get-app does
+    """
+    for filename in ("pyproject.toml", "setup.cfg", "setup.py"):
+        path = os.path.join(app_path, filename)
+        if not os.path.exists(path):
+            continue
+        with open(path) as f:
+            match = re.search(r"^\s*name\s*=\s*[\"']?([\w.-]+)", f.read(), re.M)
+        if match:
+            return match.group(1).replace("-", "_")
+    return default.replace("-", "_")
+
+
+def get_required_apps(apps_path: str, app: str):
+    """
+    parses required_apps from hooks.py without importing the app
+    """
+    hooks_path = os.path.join(apps_path, app, app, "hooks.py")
+    if not os.path.exists(hooks_path):
+        return set()
+    with open(hooks_path) as f:
+        match = re.search(r"^required_apps\s*=\s*(\[.*?\])", f.read(), re.M | re.S)
+    if not match:
+        return set()
+    return {get_repo_name(required) for required in ast.literal_eval(match.group(1))}
+
+
+def get_install_order(required_apps: dict):
+    """
+    topologically sorts apps so every app comes after the apps it requires
+    """
+    order = []
+    pending = dict(required_apps)
+    while pending:
+        ready = sorted(
+            app
+            for app, required in pending.items()
+            if not (required & pending.keys())
         )
-        cprint(
-            "Set redis_socketio to redis://redis-queue:6379 for backward compatibility",  # noqa: E501
-            level=3,
+        if not ready:
+            raise RuntimeError(f"Circular required_apps between {sorted(pending)}")
+        for app in ready:
+            missing = required_apps[app] - required_apps.keys() - {"frappe"}
+            if missing:
+                cprint(f"{app} requires {sorted(missing)}, not in apps.json", level=1)
+            order.append(app)
+            del pending[app]
+    return order
+
+
+def clone_app(app: dict, apps_path: str):
+    start = time.monotonic()
+    repo_name = get_repo_name(app["url"])
+    clone_path = os.path.join(apps_path, repo_name)
+    command = ["git", "clone", "--depth", "1", "--origin", "upstream"]
+    if app.get("branch"):
+        command += ["--branch", app["branch"]]
+    command += [app["url"], clone_path]
+    run_step(f"clone {repo_name}", command, check=True)
+    app_name = get_app_name(clone_path, default=repo_name)
+    if app_name != repo_name:
+        os.rename(clone_path, os.path.join(apps_path, app_name))
+    return app_name, time.monotonic() - start
+
+
+def install_app_node_packages(args, bench_path: str, app: str):
+    start = time.monotonic()
+    app_path = os.path.join(bench_path, "apps", app)
+    if os.path.exists(os.path.join(app_path, "package.json")):
+        run_step(
+            f"yarn install {app}",
+            get_shell_command(args, "yarn install --check-files"),
+            check=True,
+            cwd=app_path,
         )
-        subprocess.call(
+    return app, time.monotonic() - start
+
+
+def print_app_timings(timings: dict):
+    cprint("App fetch timings (seconds):", level=2)
+    steps = ("clone", "pip", "yarn")
+    cprint(f"{'app':<30}" + "".join(f"{step:>10}" for step in steps), level=3)
+    for app, timing in sorted(
+        timings.items(), key=lambda item: sum(item[1].values()), reverse=True
+    ):
+        row = "".join(f"{timing.get(step, 0):>10.1f}" for step in steps)
+        cprint(f"{app:<30}{row}", level=3)
+
+
+def fetch_apps_in_parallel(args):
+    bench_path = os.path.join(os.getcwd(), args.bench_name)
+    apps_path = os.path.join(bench_path, "apps")
+    with open(args.apps_json) as f:
+        apps = json.load(f)
+
+    timings = {}
+    cprint(f"Cloning {len(apps)} apps with {args.jobs} workers ...", level=2)
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [executor.submit(clone_app, app, apps_path) for app in apps]
+        for future in as_completed(futures):
+            app_name, elapsed = future.result()
+            timings[app_name] = {"clone": elapsed}
+            cprint(f"Cloned {app_name} in {elapsed:.1f}s", level=3)
+
+    install_order = get_install_order(
+        {app: get_required_apps(apps_path, app) for app in timings}
+    )
+
+    # pip is not safe to run concurrently against the same virtualenv
+    for app in install_order:
+        cprint(f"Installing python dependencies for {app}", level=3)
+        start = time.monotonic()
+        run_step(
+            f"pip install {app}",
             [
-                "bench",
-                "set-config",
-                "-g",
-                "redis_socketio",
-                "redis://redis-queue:6379",
+                os.path.join(bench_path, "env", "bin", "python"),
+                "-m",
+                "pip",
+                "install",
+                "--quiet",
+                "--upgrade",
+                "-e",
+                os.path.join("apps", app),
             ],
-            cwd=os.getcwd() + "/" + args.bench_name,
-        )
-        cprint("Set developer_mode", level=3)
-        subprocess.call(
-            ["bench", "set-config", "-gp", "developer_mode", "1"],
-            cwd=os.getcwd() + "/" + args.bench_name,
+            check=True,
+            cwd=bench_path,
         )
-    except subprocess.CalledProcessError as e:
-        cprint(e.output, level=1)
+        timings[app]["pip"] = time.monotonic() - start
+        with open(os.path.join(bench_path, "sites", "apps.txt"), "a") as f:
+            f.write(f"\n{app}")
 
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        futures = [
+            executor.submit(install_app_node_packages, args, bench_path, app)
+            for app in install_order
+        ]
+        for future in as_completed(futures):
+            app_name, elapsed = future.result()
+            timings[app_name]["yarn"] = elapsed
 
-def create_site_in_bench(args):
+    cprint("Building assets for all apps ...", level=2)
+    run_step(
+        "bench build",
+        get_shell_command(args, "bench build"),
+        check=True,
+        cwd=bench_path,
+    )
+    print_app_timings(timings)
+
+
+def get_new_site_command(args, site_name: str, apps: list):
     if "mariadb" == args.db_type:
-        cprint("Set db_host", level=3)
-        subprocess.call(
-            ["bench", "set-config", "-g", "db_host", "mariadb"],
-            cwd=os.getcwd() + "/" + args.bench_name,
-        )
         new_site_cmd = [
             "bench",
             "new-site",
@@ -215,11 +521,6 @@ def create_site_in_bench(args):
             f"--admin-password={args.admin_password}",
         ]
     else:
-        cprint("Set db_host", level=3)
-        subprocess.call(
-            ["bench", "set-config", "-g", "db_host", "postgresql"],
-            cwd=os.getcwd() + "/" + args.bench_name,
-        )
         new_site_cmd = [
             "bench",
             "new-site",
@@ -229,16 +530,279 @@ def create_site_in_bench(args):
             f"--db-root-password=123",  # Replace with your PostgreSQL password
             f"--admin-password={args.admin_password}",
         ]
-    apps = os.listdir(f"{os.getcwd()}/{args.bench_name}/apps")
-    apps.remove("frappe")
     for app in apps:
         new_site_cmd.append(f"--install-app={app}")
-    new_site_cmd.append(args.site_name)
-    cprint(f"Creating Site {args.site_name} ...", level=2)
-    subprocess.call(
-        new_site_cmd,
-        cwd=os.getcwd() + "/" + args.bench_name,
+    new_site_cmd.append(site_name)
+    return new_site_cmd
+
+
+def get_bench_apps(args):
+    apps = os.listdir(f"{os.getcwd()}/{args.bench_name}/apps")
+    apps.remove("frappe")
+    return apps
+
+
+def get_sites(args):
+    """
+    returns list of {"site_name": str, "apps": list} to create
+    sites manifest entries without "apps" get every app in the bench
+    """
+    if args.sites_manifest:
+        with open(args.sites_manifest) as f:
+            sites = json.load(f)
+    elif args.sites:
+        sites = [{"site_name": site_name} for site_name in args.sites]
+    else:
+        sites = [{"site_name": args.site_name}]
+
+    bench_apps = get_bench_apps(args)
+    for site in sites:
+        if "apps" not in site:
+            site["apps"] = bench_apps
+        missing = set(site["apps"]) - set(bench_apps)
+        if missing:
+            raise ValueError(f"{site['site_name']} uses apps not in bench: {missing}")
+    return sites
+
+
+def get_app_commit(bench_path: str, app: str):
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"],
+            cwd=os.path.join(bench_path, "apps", app),
+            text=True,
+        ).strip()
+    except subprocess.CalledProcessError:
+        return "unknown"
+
+
+def get_template_key(args, apps: list):
+    """
+    hash of apps json, db type and the commit of every installed app
+    a change to any of them results in a new template
+    """
+    bench_path = os.path.join(os.getcwd(), args.bench_name)
+    digest = hashlib.sha256(args.db_type.encode())
+    if os.path.exists(args.apps_json):
+        with open(args.apps_json, "rb") as f:
+            digest.update(f.read())
+    for app in ["frappe"] + sorted(apps):
+        digest.update(f"{app}:{get_app_commit(bench_path, app)}".encode())
+    return digest.hexdigest()[:16]
+
+
+def get_template_files(template_path: str):
+    """
+    returns (database, public files, private files) backup paths
+    """
+    private_files = glob.glob(os.path.join(template_path, "*-private-files.tar*"))
+    public_files = [
+        path
+        for path in glob.glob(os.path.join(template_path, "*-files.tar*"))
+        if path not in private_files
+    ]
+    database = glob.glob(os.path.join(template_path, "*-database.sql*"))
+    if not (database and public_files and private_files):
+        return None
+    return database[0], public_files[0], private_files[0]
+
+
+def ensure_site_template(args, apps: list):
+    """
+    builds the template site once per key and keeps only its backup
+    """
+    bench_path = os.path.join(os.getcwd(), args.bench_name)
+    key = get_template_key(args, apps)
+    template_path = os.path.join(bench_path, "site-templates", key)
+    template_files = get_template_files(template_path)
+    if template_files:
+        cprint(f"Using site template {key}", level=3)
+        return template_files
+
+    template_site = f"template-{key}.localhost"
+    cprint(f"Building site template {key} for apps {sorted(apps)} ...", level=2)
+    _, _, returncode = create_site(args, {"site_name": template_site, "apps": apps})
+    if returncode:
+        raise RuntimeError(f"Couldn't create template site {template_site}")
+    os.makedirs(template_path, exist_ok=True)
+    run_step(
+        f"backup template {key}",
+        [
+            "bench",
+            "--site",
+            template_site,
+            "backup",
+            "--with-files",
+            f"--backup-path={template_path}",
+        ],
+        check=True,
+        cwd=bench_path,
+    )
+    run_step(
+        f"drop template {key}",
+        [
+            "bench",
+            "drop-site",
+            template_site,
+            "--no-backup",
+            "--force",
+            "--root-login=root",
+            "--root-password=123",
+        ],
+        check=True,
+        cwd=bench_path,
+    )
+    with open(os.path.join(template_path, "manifest.json"), "w") as f:
+        json.dump({"key": key, "db_type": args.db_type, "apps": sorted(apps)}, f)
+    return get_template_files(template_path)
+
+
+def restore_supports_host_scope(args):
+    """
+    older frappe versions only accept --mariadb-user-host-login-scope in new-site
+    """
+    result = subprocess.run(
+        ["bench", "restore", "--help"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+        cwd=os.path.join(os.getcwd(), args.bench_name),
     )
+    return "--mariadb-user-host-login-scope" in result.stdout
+
+
+def get_restore_site_command(
+    args, site_name: str, template_files: tuple, host_scope: bool = False
+):
+    database, public_files, private_files = template_files
+    command = [
+        "bench",
+        "--site",
+        site_name,
+        "restore",
+        database,
+        f"--with-public-files={public_files}",
+        f"--with-private-files={private_files}",
+        f"--db-root-username=root",
+        f"--db-root-password=123",
+        f"--admin-password={args.admin_password}",
+    ]
+    if host_scope:
+        # same as new-site, the db user has to log in from other containers
+        command.append(f"--mariadb-user-host-login-scope=%")
+    return command
+
+
+def quote_sql(value: str):
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def get_grant_host_scope_command(args, site_name: str):
+    """
+    grants the site db user login from any host after a restore without
+    --mariadb-user-host-login-scope, like new-site does with it
+    """
+    config_path = os.path.join(
+        os.getcwd(), args.bench_name, "sites", site_name, "site_config.json"
+    )
+    with open(config_path) as f:
+        config = json.load(f)
+    db_name = config["db_name"]
+    user = f"{quote_sql(config.get('db_user') or db_name)}@'%'"
+    sql = (
+        f"CREATE USER IF NOT EXISTS {user} "
+        f"IDENTIFIED BY {quote_sql(config['db_password'])}; "
+        f"GRANT ALL PRIVILEGES ON `{db_name}`.* TO {user}; "
+        "FLUSH PRIVILEGES;"
+    )
+    return [
+        "mysql",
+        f"--host={get_db_host(args)}",
+        "--user=root",
+        "--password=123",  # Replace with your MariaDB password
+        "--execute",
+        sql,
+    ]
+
+
+def create_site(args, site: dict):
+    """
+    returns (site_name, elapsed seconds, bench new-site return code)
+    """
+    cprint(f"Creating Site {site['site_name']} ...", level=2)
+    bench_path = os.path.join(os.getcwd(), args.bench_name)
+    host_scope = site.get("restore_host_scope", False)
+    if site.get("template_files"):
+        step = f"restore {site['site_name']}"
+        command = get_restore_site_command(
+            args, site["site_name"], site["template_files"], host_scope
+        )
+    else:
+        step = f"new-site {site['site_name']}"
+        command = get_new_site_command(args, site["site_name"], site["apps"])
+    start = time.monotonic()
+    returncode = run_step(step, command, cwd=bench_path)
+    if site.get("template_files") and not returncode:
+        returncode = finish_restored_site(args, site["site_name"], host_scope)
+    return site["site_name"], time.monotonic() - start, returncode
+
+
+def finish_restored_site(args, site_name: str, host_scope: bool):
+    """
+    grants the db user host scope if restore couldn't and checks that
+    the restored site connects to its database
+    """
+    bench_path = os.path.join(os.getcwd(), args.bench_name)
+    if "mariadb" == args.db_type and not host_scope:
+        returncode = run_step(
+            f"grant {site_name}",
+            get_grant_host_scope_command(args, site_name),
+            cwd=bench_path,
+        )
+        if returncode:
+            return returncode
+    return run_step(
+        f"check {site_name}",
+        ["bench", "--site", site_name, "list-apps"],
+        stdout=subprocess.DEVNULL,
+        cwd=bench_path,
+    )
+
+
+def print_sites_summary(results: list):
+    cprint("Site creation summary:", level=2)
+    for site_name, elapsed, returncode in sorted(results, key=lambda r: -r[1]):
+        if returncode:
+            cprint(f"{site_name:<40}{elapsed:>8.1f}s  FAILED ({returncode})", level=1)
+        else:
+            cprint(f"{site_name:<40}{elapsed:>8.1f}s  ok", level=3)
+
+
+def create_site_in_bench(args):
+    sites = get_sites(args)
+    if args.site_template:
+        # templates are built before the pool so concurrent sites share them
+        templates = {}
+        host_scope = "mariadb" == args.db_type and restore_supports_host_scope(args)
+        for site in sites:
+            apps = tuple(sorted(site["apps"]))
+            if apps not in templates:
+                templates[apps] = ensure_site_template(args, list(apps))
+            site["template_files"] = templates[apps]
+            site["restore_host_scope"] = host_scope
+    if len(sites) == 1:
+        create_site(args, sites[0])
+        return
+
+    # every new-site hits the shared db service, keep the pool small
+    results = []
+    with ThreadPoolExecutor(max_workers=args.site_jobs) as executor:
+        futures = [executor.submit(create_site, args, site) for site in sites]
+        for future in as_completed(futures):
+            results.append(future.result())
+    print_sites_summary(results)
+    if any(returncode for _, _, returncode in results):
+        raise SystemExit(1)
 
 
 if __name__ == "__main__":
@@ -111,3 +111,45 @@ target "build" {
     target = "build"
     tags = tag("build", "${ERPNEXT_VERSION}")
 }
+
+# Production image from images/production/apps.json with a cached stage per app,
+# generate the Containerfile first with `python3 images/production/build_plan.py`
+target "erpnext-apps" {
+    inherits = ["erpnext"]
+    dockerfile = "images/production/Containerfile.apps"
+    contexts = {
+        base = "target:base"
+        build = "target:build"
+    }
+}
+
+# Slim images per compose service, built from the same stages as erpnext.
+# configurator keeps using erpnext for its tooling, the scheduler runs from worker
+
+group "roles" {
+    targets = ["backend", "worker", "websocket", "frontend"]
+}
+
+target "backend" {
+    inherits = ["erpnext"]
+    target = "backend"
+    tags = tag("erpnext-backend", "${ERPNEXT_VERSION}")
+}
+
+target "worker" {
+    inherits = ["erpnext"]
+    target = "worker"
+    tags = tag("erpnext-worker", "${ERPNEXT_VERSION}")
+}
+
+target "websocket" {
+    inherits = ["erpnext"]
+    target = "websocket"
+    tags = tag("erpnext-websocket", "${ERPNEXT_VERSION}")
+}
+
+target "frontend" {
+    inherits = ["erpnext"]
+    target = "frontend"
+    tags = tag("erpnext-frontend", "${ERPNEXT_VERSION}")
+}
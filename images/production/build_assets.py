@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Runs one `bench build` for every app of the bench and reports, per app, how long
+its build command took and how big the files it produced are.
+
+Frappe runs `yarn build` for apps that have a build script and then bundles all
+apps in a single esbuild run. The yarn builds are timed through a yarn shim on
+PATH, the rest of the total is esbuild.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import asdict, dataclass
+
+BENCH_PATH = "/home/frappe/frappe-bench"
+
+YARN_SHIM = """\
+#!/usr/bin/env python3
+import json, os, subprocess, sys, time
+
+start = time.perf_counter()
+code = subprocess.call([os.environ["REAL_YARN"], *sys.argv[1:]])
+with open(os.environ["YARN_TIMINGS"], "a") as f:
+    timing = {
+        "cwd": os.getcwd(),
+        "args": sys.argv[1:],
+        "seconds": time.perf_counter() - start,
+    }
+    f.write(json.dumps(timing) + "\\n")
+sys.exit(code)
+"""
+
+
+@dataclass
+class AppReport:
+    build_seconds: float = 0
+    files: int = 0
+    bytes: int = 0
+
+
+def get_apps(bench_path: str) -> list[str]:
+    with open(os.path.join(bench_path, "sites", "apps.txt")) as f:
+        return [line.strip() for line in f if line.strip()]
+
+
+def get_output_size(public_path: str, since: float) -> tuple[int, int]:
+    # Everything written under public/ during the build, wherever the app's
+    # bundler puts it (dist/ for esbuild, e.g. public/frontend for Vite apps)
+    files = size = 0
+    for dirpath, dirnames, filenames in os.walk(public_path):
+        dirnames[:] = [name for name in dirnames if name != "node_modules"]
+        for filename in filenames:
+            stat = os.lstat(os.path.join(dirpath, filename))
+            if stat.st_mtime >= since:
+                files += 1
+                size += stat.st_size
+    return files, size
+
+
+def run_build(bench_path: str, timings_path: str, build_args: list[str]) -> int:
+    real_yarn = shutil.which("yarn")
+    if not real_yarn:
+        print("yarn not found", file=sys.stderr)
+        return 1
+    with tempfile.TemporaryDirectory() as shim_dir:
+        shim = os.path.join(shim_dir, "yarn")
+        with open(shim, "w") as f:
+            f.write(YARN_SHIM)
+        os.chmod(shim, 0o755)
+        env = {
+            **os.environ,
+            "PATH": f"{shim_dir}{os.pathsep}{os.environ.get('PATH', '')}",
+            "REAL_YARN": real_yarn,
+            "YARN_TIMINGS": timings_path,
+        }
+        return subprocess.call(("bench", "build", *build_args), cwd=bench_path, env=env)
+
+
+def get_build_seconds(timings_path: str, bench_path: str) -> dict[str, float]:
+    seconds: dict[str, float] = {}
+    if not os.path.exists(timings_path):
+        return seconds
+    apps_path = os.path.join(bench_path, "apps")
+    with open(timings_path) as f:
+        for line in f:
+            timing = json.loads(line)
+            if "build" not in timing["args"][:2]:
+                continue
+            relpath = os.path.relpath(timing["cwd"], apps_path)
+            app = relpath.split(os.sep)[0]
+            seconds[app] = seconds.get(app, 0) + timing["seconds"]
+    return seconds
+
+
+def print_report(reports: dict[str, AppReport], total: float) -> None:
+    width = max(len(app) for app in [*reports, "esbuild"])
+    print(f"\n{'App':<{width}}  {'Build':>8}  {'Files':>6}  {'Size':>10}")
+    for app, report in sorted(reports.items(), key=lambda item: -item[1].bytes):
+        build = f"{report.build_seconds:.1f}s" if report.build_seconds else "-"
+        size = f"{report.bytes / 1024:.0f}KiB"
+        print(f"{app:<{width}}  {build:>8}  {report.files:>6}  {size:>10}")
+    esbuild = total - sum(report.build_seconds for report in reports.values())
+    print(f"{'esbuild':<{width}}  {esbuild:>7.1f}s")
+    print(f"{'total':<{width}}  {total:>7.1f}s")
+
+
+def compare(
+    baseline: dict[str, dict], reports: dict[str, AppReport], threshold: float
+) -> list[str]:
+    growth = []
+    for app, report in reports.items():
+        before = baseline.get(app, {}).get("bytes")
+        if before and report.bytes > before * (1 + threshold):
+            growth.append(
+                f"{app}: {before / 1024:.0f}KiB -> {report.bytes / 1024:.0f}KiB "
+                f"(+{(report.bytes / before - 1) * 100:.0f}%)"
+            )
+    return growth
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--bench-path", default=BENCH_PATH)
+    parser.add_argument(
+        "--report", help="Write build time and bundle size per app to this JSON file"
+    )
+    parser.add_argument("--baseline", help="Earlier --report to compare sizes with")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Fail when an app's bundles grew by more than this fraction",
+    )
+    parser.add_argument(
+        "build_args", nargs=argparse.REMAINDER, help="Passed to bench build after --"
+    )
+    args = parser.parse_args(_args)
+    build_args = args.build_args[1:] if args.build_args[:1] == ["--"] else []
+
+    apps = get_apps(args.bench_path)
+    start = time.time()
+    with tempfile.NamedTemporaryFile(suffix=".jsonl") as timings:
+        returncode = run_build(args.bench_path, timings.name, build_args)
+        build_seconds = get_build_seconds(timings.name, args.bench_path)
+    total = time.time() - start
+    if returncode:
+        return returncode
+
+    reports = {}
+    for app in apps:
+        public_path = os.path.join(args.bench_path, "apps", app, app, "public")
+        files, size = get_output_size(public_path, start)
+        reports[app] = AppReport(round(build_seconds.get(app, 0), 2), files, size)
+    print_report(reports, total)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            result = {"total_seconds": round(total, 2)}
+            result["apps"] = {app: asdict(report) for app, report in reports.items()}
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            growth = compare(json.load(f)["apps"], reports, args.threshold)
+        if growth:
+            print("\nBundles grew more than the threshold:\n" + "\n".join(growth))
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+"""
+Generates a Containerfile from apps.json with stages per app, pinned to the
+app's commit. Fetching an app and installing its node packages is only redone
+when its commit changes, and runs in parallel for all apps. The apps are then
+merged and built with a single `bench build`, see build_assets.py.
+
+The base and build stages come from images/production/Containerfile through
+named contexts, see the erpnext-apps target in docker-bake.hcl.
+
+    python3 images/production/build_plan.py
+    docker buildx bake erpnext-apps
+
+Reads images/production/apps.json, the apps of the hand-written Containerfile.
+Entries take `url` and `branch` like bench, and optionally:
+  name      app name if it's not the repo name with - replaced by _
+  commit    pin a commit instead of resolving the branch
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+APPS_JSON_PATH = os.path.join(DIR, "apps.json")
+OUTPUT_PATH = os.path.join(DIR, "Containerfile.apps")
+FRAPPE_PATH = "https://github.com/metalmon/frappe.git"
+FRAPPE_BRANCH = "develop"
+
+BENCH_PATH = "/home/frappe/frappe-bench"
+SRC_PATH = "/home/frappe/src"
+PIP_CACHE_MOUNT = "type=cache,target=/home/frappe/.cache/pip,uid=1000,gid=1000"
+YARN_CACHE_MOUNT = "type=cache,target=/home/frappe/.cache/yarn,uid=1000,gid=1000"
+NPM_CACHE_MOUNT = "type=cache,target=/home/frappe/.npm,uid=1000,gid=1000"
+COMMIT_RE = re.compile(r"[0-9a-f]{40}")
+
+
+@dataclass
+class App:
+    name: str
+    url: str
+    branch: str
+    commit: str = ""
+
+
+@dataclass
+class Stage:
+    name: str
+    text: str
+    parents: list[str] = field(default_factory=list)
+    commit: str = ""
+    key: str = ""
+
+
+def get_app_name(url: str) -> str:
+    repo = url.rstrip("/").rsplit("/", 1)[-1].removesuffix(".git")
+    return repo.replace("-", "_")
+
+
+def load_apps(path: str) -> list[App]:
+    with open(path) as f:
+        entries = json.load(f)
+    apps = [
+        App(
+            name=entry.get("name") or get_app_name(entry["url"]),
+            url=entry["url"],
+            branch=entry["branch"],
+            commit=entry.get("commit", ""),
+        )
+        for entry in entries
+    ]
+    return apps
+
+
+def resolve_commit(url: str, branch: str) -> str:
+    if COMMIT_RE.fullmatch(branch):
+        return branch
+    # Tokens in urls come from the environment, like build args in the stage
+    output = subprocess.check_output(
+        (
+            "git",
+            "ls-remote",
+            os.path.expandvars(url),
+            f"refs/heads/{branch}",
+            f"refs/tags/{branch}",
+        ),
+        encoding="UTF-8",
+    )
+    refs = dict(reversed(line.split("\t")) for line in output.splitlines())
+    # Annotated tags are listed twice, the peeled ref points to the commit
+    for ref in ("heads/{}", "tags/{}^{{}}", "tags/{}"):
+        ref = f"refs/{ref.format(branch)}"
+        if ref in refs:
+            return refs[ref]
+    raise RuntimeError(f"{branch} not found in {url}")
+
+
+def resolve_commits(
+    apps: list[App], refs: dict[str, dict[str, str]] | None, jobs: int
+) -> None:
+    """
+    Fills in commits of apps that don't pin one, from `refs`
+    ({url: {branch: commit}}) or with concurrent `git ls-remote` calls.
+    """
+
+    def resolve(app: App) -> str:
+        if refs is not None:
+            return refs[app.url][app.branch]
+        return resolve_commit(app.url, app.branch)
+
+    missing = [app for app in apps if not app.commit]
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+        for app, commit in zip(missing, executor.map(resolve, missing)):
+            app.commit = commit
+
+
+def get_args(url: str) -> str:
+    # Build args referenced in the url, e.g. a token for private repos
+    return "".join(f"ARG {name}\n" for name in re.findall(r"\$\{(\w+)\}", url))
+
+
+def get_src_stage(name: str, app: App, keep_git: bool = False) -> Stage:
+    lines = [
+        f"git init --quiet {SRC_PATH}",
+        f"cd {SRC_PATH}",
+        f"git fetch --quiet --depth 1 {app.url} {app.commit}",
+        f"git checkout --quiet -b {app.branch} FETCH_HEAD",
+        "git submodule update --quiet --init --recursive --depth 1",
+    ]
+    if not keep_git:
+        lines.append("rm -rf .git")
+    text = (
+        f"FROM build AS src-{name}\n"
+        f"{get_args(app.url)}"
+        "RUN " + " \\\n  && ".join(lines) + "\n"
+    )
+    return Stage(f"src-{name}", text, commit=app.commit)
+
+
+def get_browserslist_update(path: str) -> str:
+    # Once per lockfile: the app's own and e.g. the one of its Vite frontend
+    return (
+        f"find {path} -name yarn.lock -not -path '*/node_modules/*' "
+        "-execdir npx --yes update-browserslist-db@latest \\;"
+    )
+
+
+def get_bench_stage(frappe: App) -> Stage:
+    mount = f"type=bind,from=src-frappe,source={SRC_PATH},target=/tmp/frappe,rw"
+    text = (
+        "FROM build AS bench\n"
+        f"RUN --mount={mount} \\\n"
+        f"  --mount={YARN_CACHE_MOUNT} \\\n"
+        f"  --mount={NPM_CACHE_MOUNT} \\\n"
+        "  bench init \\\n"
+        "    --frappe-path=/tmp/frappe \\\n"
+        f"    --frappe-branch={frappe.branch} \\\n"
+        "    --no-procfile \\\n"
+        "    --no-backups \\\n"
+        "    --skip-redis-config-generation \\\n"
+        "    --skip-assets \\\n"
+        "    --verbose \\\n"
+        f"    {BENCH_PATH} \\\n"
+        f"  && {get_browserslist_update(f'{BENCH_PATH}/apps/frappe')}\n"
+    )
+    return Stage("bench", text, parents=["src-frappe"])
+
+
+def get_node_stage(app: App) -> Stage:
+    # Doesn't depend on frappe, only a new app commit reinstalls its packages
+    text = (
+        f"FROM build AS node-{app.name}\n"
+        f"COPY --from=src-{app.name} --chown=frappe:frappe {SRC_PATH} {SRC_PATH}\n"
+        f"RUN --mount={YARN_CACHE_MOUNT} \\\n"
+        f"  --mount={NPM_CACHE_MOUNT} \\\n"
+        f"  cd {SRC_PATH} \\\n"
+        "  && if [ -f package.json ]; then yarn install; fi \\\n"
+        f"  && {get_browserslist_update('.')}\n"
+    )
+    return Stage(f"node-{app.name}", text, parents=[f"src-{app.name}"])
+
+
+def get_builder_stage(apps: list[App]) -> Stage:
+    copies = "".join(
+        f"COPY --from=node-{app.name} --chown=frappe:frappe "
+        f"{SRC_PATH} {BENCH_PATH}/apps/{app.name}\n"
+        for app in apps
+    )
+    names = " ".join(app.name for app in apps)
+    script = f"""\
+set -e
+cd {BENCH_PATH}
+# bench writes apps.txt without a trailing newline
+sed -i -e '$a\\' sites/apps.txt
+for app in {names}; do
+  echo $app >> sites/apps.txt
+  env/bin/pip install --quiet -e apps/$app
+done
+# One build for frappe and all apps
+python3 /usr/local/bin/build_assets.py --report build-report.json
+echo "{{}}" > sites/common_site_config.json
+find apps -mindepth 1 -path "*/.git" | xargs rm -fr
+python3 /usr/local/bin/compress_assets.py sites/assets
+"""
+    mounts = " ".join(
+        f"--mount={mount}"
+        for mount in (PIP_CACHE_MOUNT, YARN_CACHE_MOUNT, NPM_CACHE_MOUNT)
+    )
+    text = (
+        "FROM bench AS builder\n"
+        "COPY images/production/build_assets.py /usr/local/bin/build_assets.py\n"
+        f"{copies}"
+        f"RUN {mounts} <<'EOF'\n"
+        f"{script}"
+        "EOF\n"
+    )
+    return Stage(
+        "builder", text, parents=["bench", *(f"node-{app.name}" for app in apps)]
+    )
+
+
+def get_final_stage() -> Stage:
+    text = f"""\
+FROM base AS erpnext
+
+USER frappe
+
+RUN echo "echo \\"Commands restricted in prodution container, Read FAQ before you proceed: https://frappe.fyi/ctr-faq\\"" >> ~/.bashrc
+
+COPY --from=builder --chown=frappe:frappe {BENCH_PATH} {BENCH_PATH}
+
+WORKDIR {BENCH_PATH}
+
+VOLUME [ \\
+  "{BENCH_PATH}/sites", \\
+  "{BENCH_PATH}/sites/assets", \\
+  "{BENCH_PATH}/logs" \\
+]
+
+CMD [ "/usr/local/bin/gunicorn_launcher.py" ]
+"""
+    return Stage("erpnext", text, parents=["builder"])
+
+
+def get_stages(frappe: App, apps: list[App]) -> list[Stage]:
+    stages = [
+        get_src_stage("frappe", frappe, keep_git=True),
+        *(get_src_stage(app.name, app) for app in apps),
+        get_bench_stage(frappe),
+        *(get_node_stage(app) for app in apps),
+        get_builder_stage(apps),
+        get_final_stage(),
+    ]
+    # Same definition and inputs, same key: that's when the layer cache is reused
+    keys: dict[str, str] = {}
+    for stage in stages:
+        digest = hashlib.sha256(stage.text.encode())
+        for parent in stage.parents:
+            digest.update(keys[parent].encode())
+        stage.key = keys[stage.name] = digest.hexdigest()
+    return stages
+
+
+def render(stages: list[Stage], apps_json: str) -> str:
+    header = (
+        "# syntax=docker/dockerfile:1\n"
+        "# Generated by images/production/build_plan.py "
+        f"from {apps_json}, do not edit.\n"
+        "# Stages `base` and `build` come from images/production/Containerfile,\n"
+        "# build with: docker buildx bake erpnext-apps\n"
+    )
+    return "\n".join([header, *(stage.text for stage in stages)])
+
+
+def print_keys(stages: list[Stage]) -> None:
+    width = max(len(stage.name) for stage in stages)
+    for stage in stages:
+        commit = stage.commit[:12] or "-"
+        print(f"{stage.name:<{width}}  {commit:<12}  {stage.key[:16]}")
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Generate a per-app cached Containerfile from apps.json"
+    )
+    parser.add_argument("--apps-json", default=APPS_JSON_PATH)
+    parser.add_argument("--output", default=OUTPUT_PATH)
+    parser.add_argument("--frappe-path", default=FRAPPE_PATH)
+    parser.add_argument("--frappe-branch", default=FRAPPE_BRANCH)
+    parser.add_argument(
+        "--refs-file",
+        help="Resolve commits from JSON {url: {branch: commit}} instead of the network",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=8, help="Concurrent ls-remote calls"
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Print stage cache keys instead of writing the Containerfile",
+    )
+    args = parser.parse_args(_args)
+
+    apps = load_apps(args.apps_json)
+    frappe = App("frappe", args.frappe_path, args.frappe_branch)
+    refs = None
+    if args.refs_file:
+        with open(args.refs_file) as f:
+            refs = json.load(f)
+    try:
+        resolve_commits([frappe, *apps], refs, args.jobs)
+    except (subprocess.CalledProcessError, RuntimeError, KeyError) as e:
+        print(f"Can't resolve commits: {e}", file=sys.stderr)
+        return 1
+
+    stages = get_stages(frappe, apps)
+    if args.dry_run:
+        print_keys(stages)
+        return 0
+
+    with open(args.output, "w") as f:
+        f.write(render(stages, os.path.relpath(args.apps_json)))
+    print(f"Wrote {args.output} with {len(stages)} stages")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Backs up the sites of a bench to restic, several sites at a time.
+
+The database dump of a site is streamed from mysqldump or pg_dump straight into
+`restic backup --stdin`, without a temporary file, and its files are backed up
+from the site folder without earlier backups and locks. Assets are never part
+of a backup since they come with the image.
+
+Dumps are stored uncompressed and left to restic, which compresses them with
+repository format 2 and only uploads the chunks that changed since the previous
+snapshot of the site. Every site gets a `database` and a `files` snapshot, tagged
+`site:<site>` and `run:<start time>` so restore_sites.py restores the two of the
+same run.
+
+Uses the restic environment variables, e.g. RESTIC_REPOSITORY, RESTIC_PASSWORD
+and AWS_ACCESS_KEY_ID/AWS_SECRET_ACCESS_KEY for S3.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import suppress
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+BENCH_PATH = "/home/frappe/frappe-bench"
+# Same host for every container, restic finds the parent snapshot by host and path
+RESTIC_HOST = "frappe-bench"
+TAG = "frappe-backup"
+DUMP_FILENAME = "database.sql"
+# Relative to the site folder
+FILES_EXCLUDES = ("private/backups", "locks")
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    pass
+
+
+@dataclass
+class Database:
+    type: str
+    name: str
+    user: str
+    password: str
+    host: str
+    port: int
+
+
+@dataclass
+class SiteReport:
+    site: str
+    ok: bool = False
+    error: str = ""
+    # Uncompressed dump size
+    dump_bytes: int = 0
+    # What restic stored after deduplication and compression
+    dump_added: int = 0
+    files_bytes: int = 0
+    files_added: int = 0
+    seconds: float = 0
+    snapshots: list[str] = field(default_factory=list)
+
+
+def read_config(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def get_sites(sites_path: str) -> list[str]:
+    # Hidden folders are restores in progress or replaced sites, see restore_sites.py
+    return sorted(
+        name
+        for name in os.listdir(sites_path)
+        if not name.startswith(".")
+        and os.path.isfile(os.path.join(sites_path, name, "site_config.json"))
+    )
+
+
+def get_database(sites_path: str, site: str) -> Database:
+    config = read_config(os.path.join(sites_path, "common_site_config.json"))
+    config.update(read_config(os.path.join(sites_path, site, "site_config.json")))
+    if "db_name" not in config:
+        raise BackupError(f"{site}: db_name missing in site_config.json")
+    db_type = config.get("db_type", "mariadb")
+    return Database(
+        type=db_type,
+        name=config["db_name"],
+        user=config.get("db_user") or config["db_name"],
+        password=config.get("db_password", ""),
+        host=config.get("db_host", "localhost"),
+        port=int(config.get("db_port") or (5432 if db_type == "postgres" else 3306)),
+    )
+
+
+def get_dump_command(db: Database) -> tuple[tuple[str, ...], dict[str, str]]:
+    # Passwords go through the environment, not the process list
+    if db.type == "postgres":
+        return (
+            "pg_dump",
+            f"--host={db.host}",
+            f"--port={db.port}",
+            f"--username={db.user}",
+            "--no-owner",
+            db.name,
+        ), {"PGPASSWORD": db.password}
+    return (
+        "mysqldump",
+        f"--host={db.host}",
+        f"--port={db.port}",
+        f"--user={db.user}",
+        "--single-transaction",
+        "--quick",
+        "--lock-tables=false",
+        db.name,
+    ), {"MYSQL_PWD": db.password}
+
+
+def get_restic_args(site: str, kind: str, host: str, run: str) -> list[str]:
+    return [
+        "restic",
+        "backup",
+        "--json",
+        f"--host={host}",
+        f"--tag={TAG},site:{site},{kind},run:{run}",
+    ]
+
+
+def get_summary(output: str) -> dict:
+    for line in reversed(output.splitlines()):
+        if '"summary"' in line:
+            try:
+                summary = json.loads(line)
+            except ValueError:
+                raise BackupError(f"Invalid restic summary: {line[:500]}") from None
+            # Without a snapshot nothing was saved, e.g. an interrupted backup
+            if not isinstance(summary, dict) or "snapshot_id" not in summary:
+                raise BackupError(f"No snapshot in restic summary: {line[:500]}")
+            return summary
+    raise BackupError(f"No summary in restic output: {output[-500:]}")
+
+
+def stream_dump(site: str, db: Database, host: str, run: str) -> tuple[int, dict]:
+    """
+    Pipes the dump into restic, returns the dump size and restic's summary.
+    restic is interrupted if the dump fails, so no partial snapshot is saved.
+    """
+    dump_cmd, dump_env = get_dump_command(db)
+    restic_cmd = [
+        *get_restic_args(site, "database", host, run),
+        "--stdin",
+        f"--stdin-filename={site}/{DUMP_FILENAME}",
+    ]
+    dump = subprocess.Popen(
+        dump_cmd,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env={**os.environ, **dump_env},
+    )
+    restic = subprocess.Popen(
+        restic_cmd,
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+    )
+    assert dump.stdout and dump.stderr and restic.stdin and restic.stdout
+    # Drained in the background so neither process blocks on a full pipe
+    output: list[bytes] = []
+    reader = threading.Thread(target=lambda: output.append(restic.stdout.read()))
+    reader.start()
+    errors: list[bytes] = []
+    error_reader = threading.Thread(target=lambda: errors.append(dump.stderr.read()))
+    error_reader.start()
+
+    size = 0
+    restic_exited = False
+    try:
+        while chunk := dump.stdout.read(CHUNK_SIZE):
+            restic.stdin.write(chunk)
+            size += len(chunk)
+    except BrokenPipeError:
+        restic_exited = True
+        dump.kill()
+    dump.wait()
+    error_reader.join()
+    if dump.returncode and not restic_exited:
+        restic.send_signal(signal.SIGINT)
+    with suppress(BrokenPipeError):
+        restic.stdin.close()
+    restic.wait()
+    reader.join()
+    if restic_exited or (restic.returncode and not dump.returncode):
+        message = output[0].decode(errors="replace").strip()
+        raise BackupError(f"restic failed: {message}")
+    if dump.returncode:
+        message = errors[0].decode(errors="replace").strip()
+        raise BackupError(f"{dump_cmd[0]} failed: {message}")
+    return size, get_summary(output[0].decode())
+
+
+def backup_files(sites_path: str, site: str, host: str, run: str) -> dict:
+    site_path = os.path.join(sites_path, site)
+    excludes = [
+        f"--exclude={os.path.join(site_path, exclude)}" for exclude in FILES_EXCLUDES
+    ]
+    result = subprocess.run(
+        (*get_restic_args(site, "files", host, run), *excludes, site_path),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="UTF-8",
+    )
+    if result.returncode:
+        raise BackupError(f"restic failed: {result.stdout.strip()}")
+    return get_summary(result.stdout)
+
+
+def backup_site(
+    sites_path: str, site: str, host: str, run: str, with_files: bool = True
+) -> SiteReport:
+    report = SiteReport(site)
+    start = time.perf_counter()
+    try:
+        db = get_database(sites_path, site)
+        report.dump_bytes, summary = stream_dump(site, db, host, run)
+        report.dump_added = summary.get("data_added", 0)
+        report.snapshots.append(summary["snapshot_id"])
+        if with_files:
+            summary = backup_files(sites_path, site, host, run)
+            report.files_bytes = summary.get("total_bytes_processed", 0)
+            report.files_added = summary.get("data_added", 0)
+            report.snapshots.append(summary["snapshot_id"])
+        report.ok = True
+    # ValueError: e.g. a db_port that isn't a number in site_config.json
+    except (BackupError, OSError, ValueError) as e:
+        report.error = str(e)
+    report.seconds = round(time.perf_counter() - start, 2)
+    return report
+
+
+def format_size(size: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < 1024 or unit == "GiB":
+            return f"{size:.0f}{unit}" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+    return ""
+
+
+def print_report(reports: list[SiteReport], total: float) -> None:
+    width = max(len(report.site) for report in [*reports, SiteReport("Site")])
+    print(
+        f"\n{'Site':<{width}}  {'Dump':>9}  {'Added':>9}  {'Files':>9}  "
+        f"{'Added':>9}  {'Time':>7}"
+    )
+    for report in reports:
+        if not report.ok:
+            print(f"{report.site:<{width}}  failed: {report.error}")
+            continue
+        sizes = (
+            report.dump_bytes,
+            report.dump_added,
+            report.files_bytes,
+            report.files_added,
+        )
+        columns = "  ".join(f"{format_size(size):>9}" for size in sizes)
+        print(f"{report.site:<{width}}  {columns}  {report.seconds:>6.1f}s")
+    print(f"{'total':<{width}}  {total:>50.1f}s")
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Back up database dumps and files of sites to restic"
+    )
+    parser.add_argument(
+        "--site", action="append", help="Site to back up, all sites by default"
+    )
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=int(os.getenv("BACKUP_JOBS") or 2),
+        help="Sites backed up at the same time",
+    )
+    parser.add_argument(
+        "--skip-files", action="store_true", help="Only back up the databases"
+    )
+    parser.add_argument("--bench-path", default=BENCH_PATH)
+    parser.add_argument(
+        "--host",
+        default=os.getenv("RESTIC_HOST") or RESTIC_HOST,
+        help="restic host of the snapshots",
+    )
+    parser.add_argument("--report", help="Write the per-site report to this JSON file")
+    args = parser.parse_args(_args)
+
+    sites_path = os.path.join(args.bench_path, "sites")
+    sites = args.site or get_sites(sites_path)
+    if not sites:
+        print("No sites to back up", file=sys.stderr)
+        return 1
+
+    run = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        reports = list(
+            executor.map(
+                lambda site: backup_site(
+                    sites_path, site, args.host, run, with_files=not args.skip_files
+                ),
+                sites,
+            )
+        )
+    print_report(reports, time.perf_counter() - start)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump([asdict(report) for report in reports], f, indent=2)
+    return 0 if all(report.ok for report in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Writes .gz and .br siblings for compressible files under sites/assets,
+so nginx serves them with gzip_static/brotli_static instead of compressing
+the same bundles on every request.
+
+Run after `bench build`. Needs the `brotli` CLI for .br files, without it
+only .gz files are written.
+"""
+
+from __future__ import annotations
+
+import argparse
+import gzip
+import os
+import shutil
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+ASSETS_PATH = "/home/frappe/frappe-bench/sites/assets"
+
+# Same types as gzip_types in nginx-template.conf
+EXTENSIONS = (
+    ".css",
+    ".eot",
+    ".html",
+    ".ico",
+    ".js",
+    ".json",
+    ".map",
+    ".mjs",
+    ".otf",
+    ".svg",
+    ".ttf",
+    ".txt",
+    ".xml",
+)
+# Same as gzip_min_length
+MIN_SIZE = 256
+
+
+@dataclass
+class Result:
+    path: str
+    size: int
+    gzip_size: int | None = None
+    brotli_size: int | None = None
+
+
+def find_assets(root: str) -> list[str]:
+    # sites/assets/<app> are symlinks to apps/<app>/<app>/public
+    paths = set()
+    for dirpath, _, filenames in os.walk(root, followlinks=True):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if not filename.endswith(EXTENSIONS) or os.path.getsize(path) < MIN_SIZE:
+                continue
+            paths.add(os.path.realpath(path))
+    return sorted(paths)
+
+
+def keep_if_smaller(path: str, compressed: str, size: int) -> int | None:
+    compressed_size = os.path.getsize(compressed)
+    if compressed_size >= size:
+        os.remove(compressed)
+        return None
+    # nginx takes Last-Modified and ETag from the sibling, keep them equal
+    stat = os.stat(path)
+    os.utime(compressed, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    return compressed_size
+
+
+def compress(path: str, brotli: str | None) -> Result:
+    result = Result(path, os.path.getsize(path))
+
+    with open(path, "rb") as src, open(f"{path}.gz", "wb") as raw:
+        # mtime=0 makes the output reproducible between builds
+        with gzip.GzipFile(
+            filename="", mode="wb", fileobj=raw, compresslevel=9, mtime=0
+        ) as dst:
+            shutil.copyfileobj(src, dst)
+    result.gzip_size = keep_if_smaller(path, f"{path}.gz", result.size)
+
+    if brotli:
+        subprocess.check_call(
+            (brotli, "--force", "--keep", "--best", "--output", f"{path}.br", path)
+        )
+        result.brotli_size = keep_if_smaller(path, f"{path}.br", result.size)
+    return result
+
+
+def print_summary(results: list[Result], elapsed: float) -> None:
+    total = sum(result.size for result in results)
+    gzip_total = sum(result.gzip_size or result.size for result in results)
+    print(f"Compressed {len(results)} files in {elapsed:.1f}s")
+    print(f"Original: {total / 1024**2:.1f}MiB")
+    print(f"gzip: {gzip_total / 1024**2:.1f}MiB")
+    if any(result.brotli_size for result in results):
+        brotli_total = sum(result.brotli_size or result.size for result in results)
+        print(f"brotli: {brotli_total / 1024**2:.1f}MiB")
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", nargs="?", default=ASSETS_PATH)
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument(
+        "--no-brotli", action="store_true", help="Only write .gz files"
+    )
+    args = parser.parse_args(_args)
+
+    brotli = None if args.no_brotli else shutil.which("brotli")
+    if not brotli and not args.no_brotli:
+        print("brotli not found, only writing .gz files", file=sys.stderr)
+
+    start = time.perf_counter()
+    paths = find_assets(args.path)
+    with ThreadPoolExecutor(max_workers=args.jobs) as executor:
+        results = list(executor.map(lambda path: compress(path, brotli), paths))
+    print_summary(results, time.perf_counter() - start)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
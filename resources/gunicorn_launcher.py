@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Starts gunicorn for the backend with workers and threads sized to the
+container's cgroup CPU and memory limits. GUNICORN_* variables override the
+computed values, extra arguments are passed to gunicorn as is.
+
+Run with --print to see the command without starting gunicorn.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import re
+import sys
+from dataclasses import asdict, dataclass
+
+from resource_limits import CGROUP_ROOT, Limits, get_limits
+
+GUNICORN_PATH = "/home/frappe/frappe-bench/env/bin/gunicorn"
+SITES_PATH = "/home/frappe/frappe-bench/sites"
+
+# Rough resident size of a preloaded Frappe worker under load
+WORKER_MEMORY = 256 * 1024 * 1024
+# Without cgroup limits the host's resources say little about the container's
+# share, keep the workers and threads compose.yaml used to start
+UNLIMITED_WORKERS = 2
+UNLIMITED_THREADS = 4
+# Threads mostly wait on the database and cost little memory, they make up for
+# the workers that didn't fit in memory
+THREADS_PER_WORKER = 4
+MAX_THREADS = 8
+
+DEFAULTS = {
+    "GUNICORN_BIND": "0.0.0.0:8000",
+    "GUNICORN_TIMEOUT": "120",
+    # Same as bench's production setup
+    "GUNICORN_MAX_REQUESTS": "5000",
+    "GUNICORN_MAX_REQUESTS_JITTER": "500",
+}
+
+VALIDATORS = {
+    "GUNICORN_BIND": r"[\w.\-\[\]:]+:\d+",
+    "GUNICORN_WORKERS": r"[1-9]\d*",
+    "GUNICORN_THREADS": r"[1-9]\d*",
+    "GUNICORN_TIMEOUT": r"\d+",
+    "GUNICORN_MAX_REQUESTS": r"\d+",
+    "GUNICORN_MAX_REQUESTS_JITTER": r"\d+",
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+@dataclass
+class Config:
+    bind: str
+    workers: int
+    threads: int
+    timeout: int
+    max_requests: int
+    max_requests_jitter: int
+
+
+def get_cpu_workers(limits: Limits) -> int:
+    # The usual 2 * CPUs + 1
+    return round(2 * limits.cpus) + 1
+
+
+def get_computed_workers(limits: Limits) -> int:
+    if not limits.limited:
+        return UNLIMITED_WORKERS
+    # As long as the workers fit in memory
+    memory_workers = limits.memory // WORKER_MEMORY
+    return max(1, min(get_cpu_workers(limits), memory_workers))
+
+
+def get_computed_threads(limits: Limits, workers: int) -> int:
+    """
+    4 threads per worker, more when memory allowed fewer workers than the CPUs
+    would, so the backend keeps about the same concurrency.
+    """
+    if not limits.limited:
+        return UNLIMITED_THREADS
+    threads = math.ceil(THREADS_PER_WORKER * get_cpu_workers(limits) / workers)
+    return max(THREADS_PER_WORKER, min(threads, MAX_THREADS))
+
+
+def get_config(env: dict[str, str], limits: Limits) -> Config:
+    """
+    Returns validated config, empty or missing variables take defaults.
+    """
+    settings = {**DEFAULTS, "GUNICORN_WORKERS": str(get_computed_workers(limits))}
+    for name in settings:
+        if env.get(name):
+            settings[name] = env[name]
+    if not re.fullmatch(VALIDATORS["GUNICORN_WORKERS"], settings["GUNICORN_WORKERS"]):
+        raise ConfigError(f"Invalid GUNICORN_WORKERS: {settings['GUNICORN_WORKERS']!r}")
+    # Threads follow the workers actually started, also when those are overridden
+    threads = get_computed_threads(limits, int(settings["GUNICORN_WORKERS"]))
+    settings["GUNICORN_THREADS"] = env.get("GUNICORN_THREADS") or str(threads)
+    for name, pattern in VALIDATORS.items():
+        if not re.fullmatch(pattern, settings[name]):
+            raise ConfigError(f"Invalid {name}: {settings[name]!r}")
+
+    config = Config(
+        bind=settings["GUNICORN_BIND"],
+        workers=int(settings["GUNICORN_WORKERS"]),
+        threads=int(settings["GUNICORN_THREADS"]),
+        timeout=int(settings["GUNICORN_TIMEOUT"]),
+        max_requests=int(settings["GUNICORN_MAX_REQUESTS"]),
+        max_requests_jitter=int(settings["GUNICORN_MAX_REQUESTS_JITTER"]),
+    )
+    if config.max_requests and config.max_requests_jitter >= config.max_requests:
+        raise ConfigError("GUNICORN_MAX_REQUESTS_JITTER must be less than max requests")
+    return config
+
+
+def get_command(config: Config, extra_args: list[str]) -> list[str]:
+    command = [
+        GUNICORN_PATH,
+        f"--chdir={SITES_PATH}",
+        f"--bind={config.bind}",
+        f"--threads={config.threads}",
+        f"--workers={config.workers}",
+        "--worker-class=gthread",
+        "--worker-tmp-dir=/dev/shm",
+        f"--timeout={config.timeout}",
+    ]
+    if config.max_requests:
+        command += [
+            f"--max-requests={config.max_requests}",
+            f"--max-requests-jitter={config.max_requests_jitter}",
+        ]
+    return command + ["--preload", *extra_args, "frappe.app:application"]
+
+
+def print_config(config: Config, limits: Limits) -> None:
+    print(
+        f"Limits: {limits.cpus:g} CPUs, {limits.memory // 1024**2}MiB memory",
+        flush=True,
+    )
+    print(
+        "gunicorn: " + ", ".join(f"{k}={v}" for k, v in asdict(config).items()),
+        flush=True,
+    )
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cgroup-root", default=CGROUP_ROOT)
+    parser.add_argument(
+        "--print", action="store_true", help="Print the command instead of running it"
+    )
+    args, extra_args = parser.parse_known_args(_args)
+
+    limits = get_limits(args.cgroup_root)
+    try:
+        config = get_config(dict(os.environ), limits)
+    except ConfigError as e:
+        print(f"Invalid gunicorn configuration: {e}", file=sys.stderr)
+        return 1
+
+    print_config(config, limits)
+    command = get_command(config, extra_args)
+    if args.print:
+        print(" ".join(command))
+        return 0
+    os.execv(command[0], command)
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
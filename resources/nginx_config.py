@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Renders /etc/nginx/conf.d/frappe.conf from the template and environment variables,
+and sets worker tuning in /etc/nginx/nginx.conf.
+
+Defaults for worker and cache sizing are derived from the container's cgroup
+CPU and memory limits. Run with --print to see the result without writing files.
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import re
+import sys
+
+from resource_limits import CGROUP_ROOT, Limits, get_limits
+
+TEMPLATE_PATH = "/templates/nginx/frappe.conf.template"
+CONFIG_PATH = "/etc/nginx/conf.d/frappe.conf"
+NGINX_CONF_PATH = "/etc/nginx/nginx.conf"
+MODULES_PATH = "/etc/nginx/modules-enabled"
+PROXY_CACHE_PATH = "/var/lib/nginx/frappe-cache"
+
+# Below this much memory caches and connection pools are kept small
+SMALL_MEMORY = 512 * 1024 * 1024
+
+DEFAULTS = {
+    "BACKEND": "0.0.0.0:8000",
+    "SOCKETIO": "0.0.0.0:9000",
+    "UPSTREAM_REAL_IP_ADDRESS": "127.0.0.1",
+    "UPSTREAM_REAL_IP_HEADER": "X-Forwarded-For",
+    "UPSTREAM_REAL_IP_RECURSIVE": "off",
+    "FRAPPE_SITE_NAME_HEADER": "$host",
+    "PROXY_READ_TIMEOUT": "120",
+    "CLIENT_MAX_BODY_SIZE": "50m",
+    "PROXY_BUFFER_SIZE": "128k",
+    "PROXY_BUFFERS": "4 256k",
+    "PROXY_BUSY_BUFFERS_SIZE": "256k",
+    "UPSTREAM_KEEPALIVE": "16",
+    "OPEN_FILE_CACHE_INACTIVE": "20s",
+    "OPEN_FILE_CACHE_VALID": "30s",
+    "PROXY_CACHE": "off",
+    "PROXY_CACHE_VALID": "10s",
+    "PROXY_CACHE_MAX_SIZE": "256m",
+}
+
+SIZE_RE = r"\d+[kKmMgG]?"
+TIME_RE = r"\d+(ms|s|m|h|d)?"
+ADDRESS_RE = r"[\w.\-\[\]:]+:\d+"
+
+VALIDATORS = {
+    "SOCKETIO": ADDRESS_RE,
+    "UPSTREAM_REAL_IP_RECURSIVE": r"on|off",
+    "PROXY_READ_TIMEOUT": TIME_RE,
+    "CLIENT_MAX_BODY_SIZE": SIZE_RE,
+    "PROXY_BUFFER_SIZE": SIZE_RE,
+    "PROXY_BUFFERS": rf"\d+ {SIZE_RE}",
+    "PROXY_BUSY_BUFFERS_SIZE": SIZE_RE,
+    "UPSTREAM_KEEPALIVE": r"\d+",
+    "NGINX_WORKER_PROCESSES": r"auto|[1-9]\d*",
+    "NGINX_WORKER_CONNECTIONS": r"[1-9]\d*",
+    "OPEN_FILE_CACHE_MAX": r"\d+",
+    "OPEN_FILE_CACHE_INACTIVE": TIME_RE,
+    "OPEN_FILE_CACHE_VALID": TIME_RE,
+    "PROXY_CACHE": r"on|off",
+    "PROXY_CACHE_VALID": TIME_RE,
+    "PROXY_CACHE_MAX_SIZE": SIZE_RE,
+}
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def has_brotli_static(modules_path: str = MODULES_PATH) -> bool:
+    # Debian's libnginx-mod-http-brotli-static drops a .conf here when installed
+    try:
+        return any("brotli-static" in name for name in os.listdir(modules_path))
+    except OSError:
+        return False
+
+
+def get_computed_defaults(limits: Limits) -> dict[str, str]:
+    small = limits.memory < SMALL_MEMORY
+    return {
+        "NGINX_WORKER_PROCESSES": str(max(1, math.ceil(limits.cpus))),
+        "NGINX_WORKER_CONNECTIONS": "1024" if small else "4096",
+        "OPEN_FILE_CACHE_MAX": "1000" if small else "10000",
+    }
+
+
+def parse_size(value: str) -> int:
+    units = {"k": 1024, "m": 1024**2, "g": 1024**3}
+    suffix = value[-1].lower()
+    if suffix in units:
+        return int(value[:-1]) * units[suffix]
+    return int(value)
+
+
+def validate(settings: dict[str, str]) -> None:
+    for name, pattern in VALIDATORS.items():
+        if not re.fullmatch(pattern, settings[name]):
+            raise ConfigError(f"Invalid {name}: {settings[name]!r}")
+    for backend in settings["BACKEND"].split(","):
+        if not re.fullmatch(ADDRESS_RE, backend.strip()):
+            raise ConfigError(f"Invalid BACKEND address: {backend!r}")
+
+    # nginx refuses to start otherwise
+    count, size = settings["PROXY_BUFFERS"].split()
+    buffer_size = parse_size(size)
+    busy = parse_size(settings["PROXY_BUSY_BUFFERS_SIZE"])
+    if int(count) < 2:
+        raise ConfigError("PROXY_BUFFERS needs at least 2 buffers")
+    if busy > (int(count) - 1) * buffer_size:
+        raise ConfigError(
+            "PROXY_BUSY_BUFFERS_SIZE must be less than PROXY_BUFFERS minus one buffer"
+        )
+    if busy < max(buffer_size, parse_size(settings["PROXY_BUFFER_SIZE"])):
+        raise ConfigError(
+            "PROXY_BUSY_BUFFERS_SIZE must be at least one of PROXY_BUFFERS "
+            "and PROXY_BUFFER_SIZE"
+        )
+
+
+def get_settings(
+    env: dict[str, str], limits: Limits, brotli_static: bool = False
+) -> dict[str, str]:
+    """
+    Returns validated settings, empty or missing variables take defaults.
+    `brotli_static` serves precompressed .br assets, it needs the nginx module.
+    """
+    settings = {**DEFAULTS, **get_computed_defaults(limits)}
+    for name, default in settings.items():
+        value = env.get(name)
+        if value:
+            settings[name] = value
+        else:
+            print(f"{name} defaulting to {default}")
+    validate(settings)
+
+    backends = [backend.strip() for backend in settings["BACKEND"].split(",")]
+    settings["BACKEND_SERVERS"] = "\n\t".join(
+        f"server {backend} fail_timeout=0;" for backend in backends
+    )
+    keepalive = int(settings["UPSTREAM_KEEPALIVE"])
+    settings["UPSTREAM_KEEPALIVE_DIRECTIVE"] = (
+        f"keepalive {keepalive};" if keepalive else ""
+    )
+    if int(settings["OPEN_FILE_CACHE_MAX"]):
+        settings["OPEN_FILE_CACHE"] = "\n\t".join(
+            (
+                f"open_file_cache max={settings['OPEN_FILE_CACHE_MAX']} "
+                f"inactive={settings['OPEN_FILE_CACHE_INACTIVE']};",
+                f"open_file_cache_valid {settings['OPEN_FILE_CACHE_VALID']};",
+                "open_file_cache_min_uses 2;",
+                "open_file_cache_errors on;",
+            )
+        )
+    else:
+        settings["OPEN_FILE_CACHE"] = "open_file_cache off;"
+    settings["BROTLI_STATIC"] = "brotli_static on;" if brotli_static else ""
+    settings.update(get_proxy_cache(settings))
+    return settings
+
+
+def get_proxy_cache(settings: dict[str, str]) -> dict[str, str]:
+    """
+    Directives for the anonymous page micro-cache, empty when it's off.
+    Only guest GET requests for website pages are sent to the caching location,
+    requests with a real session cookie, an Authorization header, other methods
+    and /api or /app routes are proxied as usual.
+    """
+    if settings["PROXY_CACHE"] != "on":
+        return {
+            "PROXY_CACHE_HTTP": "",
+            "PROXY_CACHE_REDIRECT": "",
+            "PROXY_CACHE_LOCATION": "",
+            "PROXY_CACHE_STATUS_HEADER": "",
+        }
+    http = (
+        f"proxy_cache_path {PROXY_CACHE_PATH} levels=1:2 keys_zone=frappe:10m "
+        f"max_size={settings['PROXY_CACHE_MAX_SIZE']} inactive=10m "
+        "use_temp_path=off;\n"
+        "\n"
+        "# Guests get sid=Guest, anything else is a logged in user.\n"
+        "# Desk and API responses depend on the user, only website pages are cached\n"
+        'map "$request_method:$cookie_sid:$http_authorization:$uri" '
+        "$frappe_cache_request {\n"
+        "\tdefault 0;\n"
+        '\t"~^GET:(Guest)?::/(api|app)(/|$)" 0;\n'
+        '\t"~^GET:(Guest)?::" 1;\n'
+        "}\n"
+    )
+    # A return in a location is the one safe use of if
+    redirect = "\n\t\t".join(
+        (
+            "error_page 418 = @cached_webserver;",
+            "if ($frappe_cache_request) {",
+            "\treturn 418;",
+            "}",
+        )
+    )
+    site = settings["FRAPPE_SITE_NAME_HEADER"]
+    directives = (
+        "proxy_http_version 1.1;",
+        "proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;",
+        "proxy_set_header X-Forwarded-Proto $forwarded_proto;",
+        f"proxy_set_header X-Frappe-Site-Name {site};",
+        "proxy_set_header Host $host;",
+        "proxy_set_header X-Use-X-Accel-Redirect True;",
+        'proxy_set_header Connection "";',
+        f"proxy_read_timeout {settings['PROXY_READ_TIMEOUT']};",
+        "proxy_redirect off;",
+        "",
+        "proxy_cache frappe;",
+        # Pages are translated by the language cookie or Accept-Language
+        f'proxy_cache_key "$forwarded_proto://{site}$request_uri'
+        '|$cookie_preferred_language|$http_accept_language";',
+        f"proxy_cache_valid 200 301 302 {settings['PROXY_CACHE_VALID']};",
+        "proxy_cache_valid 404 1s;",
+        # Pages are short lived by design, Frappe's no-cache headers would prevent
+        # caching them at all. Every guest response sets the Guest session cookies,
+        # they are not stored nor passed on.
+        "proxy_ignore_headers Cache-Control Expires Set-Cookie;",
+        "proxy_hide_header Set-Cookie;",
+        "proxy_cache_lock on;",
+        "proxy_cache_lock_timeout 5s;",
+        "proxy_cache_use_stale updating error timeout;",
+        "proxy_cache_background_update on;",
+        "",
+        "proxy_pass  http://backend-server;",
+    )
+    location = "\n".join(
+        (
+            "location @cached_webserver {",
+            *(f"\t\t{line}" if line else "" for line in directives),
+            "\t}",
+        )
+    )
+    return {
+        "PROXY_CACHE_HTTP": http,
+        "PROXY_CACHE_REDIRECT": redirect,
+        "PROXY_CACHE_LOCATION": location,
+        "PROXY_CACHE_STATUS_HEADER": "add_header X-Cache-Status $upstream_cache_status;",
+    }
+
+
+def render(template: str, settings: dict[str, str]) -> str:
+    # Like envsubst with an explicit list: nginx variables such as $host stay as is
+    def replace(match: re.Match) -> str:
+        return settings.get(match.group(1), match.group(0))
+
+    # Optional directives that render empty take their line with them
+    def replace_line(match: re.Match) -> str:
+        if settings.get(match.group(1)) == "":
+            return ""
+        return match.group(0)
+
+    template = re.sub(
+        r"^[ \t]*\$\{(\w+)\}[ \t]*\n", replace_line, template, flags=re.MULTILINE
+    )
+    return re.sub(r"\$\{(\w+)\}", replace, template)
+
+
+def render_nginx_conf(content: str, settings: dict[str, str]) -> str:
+    content = re.sub(
+        r"^(\s*)worker_processes\s+[^;]+;",
+        rf"\g<1>worker_processes {settings['NGINX_WORKER_PROCESSES']};",
+        content,
+        flags=re.MULTILINE,
+    )
+    return re.sub(
+        r"^(\s*)worker_connections\s+[^;]+;",
+        rf"\g<1>worker_connections {settings['NGINX_WORKER_CONNECTIONS']};",
+        content,
+        flags=re.MULTILINE,
+    )
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--template", default=TEMPLATE_PATH)
+    parser.add_argument("--output", default=CONFIG_PATH)
+    parser.add_argument("--nginx-conf", default=NGINX_CONF_PATH)
+    parser.add_argument("--cgroup-root", default=CGROUP_ROOT)
+    parser.add_argument("--modules", default=MODULES_PATH)
+    parser.add_argument(
+        "--print", action="store_true", help="Print the config instead of writing it"
+    )
+    args = parser.parse_args(_args)
+
+    try:
+        settings = get_settings(
+            dict(os.environ),
+            get_limits(args.cgroup_root),
+            brotli_static=has_brotli_static(args.modules),
+        )
+    except ConfigError as e:
+        print(f"Invalid nginx configuration: {e}", file=sys.stderr)
+        return 1
+
+    with open(args.template) as f:
+        config = render(f.read(), settings)
+    if args.print:
+        print(config)
+        return 0
+
+    with open(args.output, "w") as f:
+        f.write(config)
+    with open(args.nginx_conf) as f:
+        nginx_conf = render_nginx_conf(f.read(), settings)
+    with open(args.nginx_conf, "w") as f:
+        f.write(nginx_conf)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,80 @@
+"""
+Reads the container's CPU and memory limits from cgroup v1 or v2,
+falling back to the CPUs the process may run on and the host's memory when
+there are no limits.
+
+Shared by nginx_config.py and gunicorn_launcher.py.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+from dataclasses import dataclass
+
+CGROUP_ROOT = "/sys/fs/cgroup"
+
+
+@dataclass
+class Limits:
+    cpus: float
+    memory: int
+    # False when neither limit is set and both come from the host
+    limited: bool = False
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def read_cpu_limit(root: str = CGROUP_ROOT) -> float | None:
+    # cgroup v2: "<quota> <period>" or "max <period>"
+    cpu_max = _read(os.path.join(root, "cpu.max"))
+    if cpu_max:
+        quota, period = cpu_max.split()
+        return None if quota == "max" else int(quota) / int(period)
+    # cgroup v1: quota is -1 without a limit
+    quota = _read(os.path.join(root, "cpu", "cpu.cfs_quota_us"))
+    period = _read(os.path.join(root, "cpu", "cpu.cfs_period_us"))
+    if quota and period and int(quota) > 0:
+        return int(quota) / int(period)
+    return None
+
+
+def read_memory_limit(root: str = CGROUP_ROOT) -> int | None:
+    memory_max = _read(os.path.join(root, "memory.max"))
+    if memory_max:
+        return None if memory_max == "max" else int(memory_max)
+    # cgroup v1 reports a huge number without a limit
+    limit = _read(os.path.join(root, "memory", "memory.limit_in_bytes"))
+    if limit and int(limit) < 2**60:
+        return int(limit)
+    return None
+
+
+def read_total_memory() -> int:
+    meminfo = _read("/proc/meminfo") or ""
+    match = re.search(r"^MemTotal:\s+(\d+) kB", meminfo, re.MULTILINE)
+    return int(match.group(1)) * 1024 if match else 2**30
+
+
+def get_available_cpus() -> int:
+    # cpusets (docker --cpuset-cpus) restrict the CPUs, os.cpu_count() doesn't know
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def get_limits(root: str = CGROUP_ROOT) -> Limits:
+    cpu_limit = read_cpu_limit(root)
+    memory_limit = read_memory_limit(root)
+    return Limits(
+        cpus=cpu_limit or float(get_available_cpus()),
+        memory=memory_limit or read_total_memory(),
+        limited=bool(cpu_limit or memory_limit),
+    )
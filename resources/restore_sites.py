@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Restores sites from the restic snapshots of backup_sites.py, several sites at a
+time, and checks that every restored site answers again.
+
+The database and files snapshots of a site are taken from the same backup run.
+The files snapshot is restored first, which brings back site_config.json with
+the database credentials; an existing site folder is moved aside to
+`.replaced-<site>` and removed once the site is restored. The database is then
+recreated, the dump streamed from `restic dump` into mysql or psql and the
+site's cache cleared.
+With root credentials (--db-root-password, or root_login and root_password in
+common_site_config.json) the database and its user are created from scratch,
+so sites can be restored to an empty database server; without them the dump is
+loaded into the existing database as the site's user.
+
+The time of every step and the total per site, the recovery time, are printed
+at the end. List what can be restored with --list.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from datetime import datetime, timezone
+
+from backup_sites import (
+    BENCH_PATH,
+    DUMP_FILENAME,
+    TAG,
+    Database,
+    get_database,
+    read_config,
+)
+
+CHECK_URL = "http://backend:8000"
+CHECK_PATH = "/api/method/ping"
+
+
+class RestoreError(Exception):
+    pass
+
+
+@dataclass
+class Snapshot:
+    id: str
+    time: datetime
+    site: str
+    kind: str
+    paths: list[str]
+    # Start time of the backup_sites.py run, shared by its snapshots of a site
+    run: str = ""
+
+    @classmethod
+    def from_json(cls, data: dict) -> Snapshot | None:
+        tags = data.get("tags") or []
+        sites = [tag.removeprefix("site:") for tag in tags if tag.startswith("site:")]
+        kinds = [tag for tag in tags if tag in ("database", "files")]
+        runs = [tag.removeprefix("run:") for tag in tags if tag.startswith("run:")]
+        if not sites or not kinds:
+            return None
+        taken = parse_time(data["time"])
+        run = runs[0] if runs else ""
+        return cls(data["id"], taken, sites[0], kinds[0], data["paths"], run)
+
+
+@dataclass
+class SiteReport:
+    site: str
+    ok: bool = False
+    error: str = ""
+    snapshots: dict[str, str] = field(default_factory=dict)
+    # Seconds per step, total is the recovery time of the site
+    files: float = 0
+    database: float = 0
+    check: float = 0
+    total: float = 0
+
+
+def parse_time(value: str) -> datetime:
+    # restic writes nanoseconds, fromisoformat only takes microseconds
+    value = value.replace("Z", "+00:00")
+    if "." in value:
+        head, tail = value.split(".", 1)
+        digits = len(tail) - len(tail.lstrip("0123456789"))
+        value = f"{head}.{tail[:min(digits, 6)]}{tail[digits:]}"
+    parsed = datetime.fromisoformat(value)
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def list_snapshots() -> list[Snapshot]:
+    output = subprocess.check_output(
+        ("restic", "snapshots", "--json", f"--tag={TAG}"), encoding="UTF-8"
+    )
+    snapshots = (Snapshot.from_json(data) for data in json.loads(output) or [])
+    return sorted(
+        (snapshot for snapshot in snapshots if snapshot),
+        key=lambda snapshot: (snapshot.site, snapshot.time),
+    )
+
+
+def is_pair(database: Snapshot, files: Snapshot) -> bool:
+    if database.run:
+        return files.run == database.run
+    # Untagged snapshots of older backups: the files follow their database
+    return not files.run and files.time >= database.time
+
+
+def select_snapshots(
+    snapshots: list[Snapshot], before: datetime | None = None
+) -> dict[str, dict[str, Snapshot]]:
+    """
+    The latest database snapshot of every site and the files snapshot of the
+    same backup run, {site: {kind: ...}}. Files of a later run whose database
+    backup failed would not match the database.
+    """
+    by_site: dict[str, list[Snapshot]] = {}
+    for snapshot in snapshots:
+        if not before or snapshot.time <= before:
+            by_site.setdefault(snapshot.site, []).append(snapshot)
+
+    selected: dict[str, dict[str, Snapshot]] = {}
+    for site, site_snapshots in by_site.items():
+        kinds = selected[site] = {}
+        databases = [s for s in site_snapshots if s.kind == "database"]
+        if not databases:
+            continue
+        database = kinds["database"] = max(databases, key=lambda s: s.time)
+        files = [
+            s for s in site_snapshots if s.kind == "files" and is_pair(database, s)
+        ]
+        if files:
+            kinds["files"] = max(files, key=lambda s: s.time)
+    return selected
+
+
+def run(
+    cmd: tuple[str, ...], env: dict[str, str], input: str = "", cwd: str | None = None
+) -> str:
+    # Never reads the terminal, e.g. a client asking for a password
+    result = subprocess.run(
+        cmd,
+        input=input,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        env={**os.environ, **env},
+        cwd=cwd,
+        encoding="UTF-8",
+    )
+    if result.returncode:
+        raise RestoreError(f"{cmd[0]} failed: {result.stderr.strip()}")
+    return result.stdout
+
+
+def get_client_command(
+    db: Database, user: str, password: str, database: str
+) -> tuple[tuple[str, ...], dict[str, str]]:
+    if db.type == "postgres":
+        return (
+            "psql",
+            "--quiet",
+            "--no-psqlrc",
+            "--set=ON_ERROR_STOP=1",
+            f"--host={db.host}",
+            f"--port={db.port}",
+            f"--username={user}",
+            f"--dbname={database}",
+        ), {"PGPASSWORD": password}
+    return (
+        "mysql",
+        f"--host={db.host}",
+        f"--port={db.port}",
+        f"--user={user}",
+        database,
+    ), {"MYSQL_PWD": password}
+
+
+def quote(value: str, db_type: str) -> str:
+    if db_type != "postgres":
+        value = value.replace("\\", "\\\\")
+    return "'" + value.replace("'", "''") + "'"
+
+
+def get_create_sql(db: Database) -> str:
+    password, user = quote(db.password, db.type), quote(db.user, db.type)
+    if db.type == "postgres":
+        # Dumps are taken with --no-owner, the site user loads them and owns all
+        return f"""\
+DROP DATABASE IF EXISTS "{db.name}" WITH (FORCE);
+DO $$ BEGIN
+  IF EXISTS (SELECT FROM pg_roles WHERE rolname = {user}) THEN
+    ALTER ROLE "{db.user}" LOGIN PASSWORD {password};
+  ELSE
+    CREATE ROLE "{db.user}" LOGIN PASSWORD {password};
+  END IF;
+END $$;
+CREATE DATABASE "{db.name}" OWNER "{db.user}";
+"""
+    return f"""\
+DROP DATABASE IF EXISTS `{db.name}`;
+CREATE DATABASE `{db.name}` CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;
+CREATE USER IF NOT EXISTS {user}@'%' IDENTIFIED BY {password};
+ALTER USER {user}@'%' IDENTIFIED BY {password};
+GRANT ALL PRIVILEGES ON `{db.name}`.* TO {user}@'%';
+FLUSH PRIVILEGES;
+"""
+
+
+def get_replaced_path(sites_path: str, site: str) -> str:
+    return os.path.join(sites_path, f".replaced-{site}")
+
+
+def restore_files(snapshot: Snapshot, sites_path: str) -> None:
+    """
+    Replaces the site folder with the snapshot. Files added since the backup
+    must not survive, so an existing folder is moved aside instead of merged.
+    """
+    # Restored next to the site first: restic recreates the absolute path of the
+    # snapshot below the target, and the bench path may have changed since
+    target = os.path.join(sites_path, f".restore-{snapshot.site}")
+    shutil.rmtree(target, ignore_errors=True)
+    try:
+        run(("restic", "restore", snapshot.id, f"--target={target}"), env={})
+        restored = os.path.join(target, snapshot.paths[0].lstrip("/"))
+        site_path = os.path.join(sites_path, snapshot.site)
+        if os.path.exists(site_path):
+            replaced = get_replaced_path(sites_path, snapshot.site)
+            shutil.rmtree(replaced, ignore_errors=True)
+            os.rename(site_path, replaced)
+        os.rename(restored, site_path)
+    finally:
+        shutil.rmtree(target, ignore_errors=True)
+
+
+def restore_database(
+    snapshot: Snapshot, db: Database, root: tuple[str, str] | None
+) -> None:
+    if root:
+        admin_db = "postgres" if db.type == "postgres" else ""
+        cmd, env = get_client_command(db, *root, admin_db)
+        run(tuple(arg for arg in cmd if arg), env, input=get_create_sql(db))
+    # Tables belong to whoever creates them in postgres, not so in mariadb
+    user = root if root and db.type != "postgres" else (db.user, db.password)
+    client_cmd, client_env = get_client_command(db, *user, db.name)
+
+    dump = subprocess.Popen(
+        ("restic", "dump", snapshot.id, f"/{snapshot.site}/{DUMP_FILENAME}"),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    assert dump.stdout and dump.stderr
+    client = subprocess.Popen(
+        client_cmd,
+        stdin=dump.stdout,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        env={**os.environ, **client_env},
+        encoding="UTF-8",
+    )
+    # The client holds the only read end, restic gets SIGPIPE if it exits
+    dump.stdout.close()
+    _, client_errors = client.communicate()
+    dump_errors = dump.stderr.read().decode(errors="replace")
+    dump.wait()
+    if dump.returncode:
+        raise RestoreError(f"restic dump failed: {dump_errors.strip()}")
+    if client.returncode:
+        raise RestoreError(f"{client_cmd[0]} failed: {client_errors.strip()}")
+
+    # An empty or cut dump still loads, a site without doctypes doesn't work
+    check_cmd, check_env = get_client_command(db, db.user, db.password, db.name)
+    if db.type == "postgres":
+        query = 'SELECT COUNT(*) FROM "tabDocType"'
+        check_cmd += ("--tuples-only", "--no-align", f"--command={query}")
+    else:
+        query = "SELECT COUNT(*) FROM `tabDocType`"
+        check_cmd += ("--skip-column-names", f"--execute={query}")
+    if int(run(check_cmd, check_env).strip() or 0) == 0:
+        raise RestoreError("No doctypes in the restored database")
+
+
+def clear_cache(site: str, bench_path: str) -> None:
+    # Cached doctypes and sessions in redis belong to the database before the restore
+    run(("bench", "--site", site, "clear-cache"), env={}, cwd=bench_path)
+
+
+def check_site(site: str, url: str, timeout: float) -> None:
+    """Retries the request with backoff until the site answers `pong`."""
+    request = urllib.request.Request(url + CHECK_PATH, headers={"Host": site})
+    deadline = time.monotonic() + timeout
+    delay = 0.1
+    while True:
+        try:
+            with urllib.request.urlopen(request, timeout=10) as response:
+                body = response.read().decode(errors="replace")
+                if "pong" in body:
+                    return
+                error = f"unexpected response: {body[:200]}"
+        except (urllib.error.URLError, OSError) as e:
+            error = str(e)
+        if time.monotonic() + delay > deadline:
+            raise RestoreError(f"{url}{CHECK_PATH} didn't answer: {error}")
+        time.sleep(delay)
+        delay = min(delay * 2, 2)
+
+
+def get_root(
+    sites_path: str, user: str | None, password: str | None, db: Database
+) -> tuple[str, str] | None:
+    config = read_config(os.path.join(sites_path, "common_site_config.json"))
+    password = password or config.get("root_password")
+    if not password:
+        return None
+    default_user = "postgres" if db.type == "postgres" else "root"
+    return user or config.get("root_login") or default_user, password
+
+
+def restore_site(
+    site: str, snapshots: dict[str, Snapshot], args: argparse.Namespace
+) -> SiteReport:
+    ids = {kind: snapshot.id[:8] for kind, snapshot in snapshots.items()}
+    report = SiteReport(site, snapshots=ids)
+    sites_path = os.path.join(args.bench_path, "sites")
+    start = step = time.perf_counter()
+    try:
+        if "database" not in snapshots:
+            raise RestoreError("No database snapshot")
+        if "files" in snapshots:
+            restore_files(snapshots["files"], sites_path)
+        elif not os.path.exists(os.path.join(sites_path, site, "site_config.json")):
+            raise RestoreError("No files snapshot and no site_config.json")
+        report.files = round(time.perf_counter() - step, 2)
+
+        step = time.perf_counter()
+        db = get_database(sites_path, site)
+        root = get_root(sites_path, args.db_root_username, args.db_root_password, db)
+        restore_database(snapshots["database"], db, root)
+        clear_cache(site, args.bench_path)
+        report.database = round(time.perf_counter() - step, 2)
+
+        step = time.perf_counter()
+        if args.check_url:
+            check_site(site, args.check_url, args.check_timeout)
+        report.check = round(time.perf_counter() - step, 2)
+        shutil.rmtree(get_replaced_path(sites_path, site), ignore_errors=True)
+        report.ok = True
+    except (RestoreError, OSError, ValueError) as e:
+        report.error = str(e)
+        if os.path.exists(get_replaced_path(sites_path, site)):
+            report.error += f", the previous site folder is in .replaced-{site}"
+    report.total = round(time.perf_counter() - start, 2)
+    return report
+
+
+def print_snapshots(selected: dict[str, dict[str, Snapshot]]) -> None:
+    width = max(len(site) for site in [*selected, "Site"])
+    print(f"{'Site':<{width}}  {'Database':<29}  Files")
+    for site, kinds in sorted(selected.items()):
+        columns = [
+            f"{kinds[kind].id[:8]} {kinds[kind].time:%Y-%m-%d %H:%M:%S}"
+            if kind in kinds
+            else "-"
+            for kind in ("database", "files")
+        ]
+        print(f"{site:<{width}}  {columns[0]:<29}  {columns[1]}")
+
+
+def print_report(reports: list[SiteReport], total: float) -> None:
+    width = max(len(report.site) for report in [*reports, SiteReport("Site")])
+    header = f"{'Files':>7}  {'Database':>8}  {'Check':>7}  {'RTO':>7}"
+    print(f"\n{'Site':<{width}}  {header}")
+    for report in reports:
+        if not report.ok:
+            print(f"{report.site:<{width}}  failed: {report.error}")
+            continue
+        steps = (report.files, report.database, report.check, report.total)
+        columns = "  ".join(
+            f"{seconds:>{width - 1}.1f}s" for seconds, width in zip(steps, (7, 8, 7, 7))
+        )
+        print(f"{report.site:<{width}}  {columns}")
+    print(f"{'total':<{width}}  {total:>36.1f}s")
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Restore sites from the restic snapshots of backup_sites.py"
+    )
+    parser.add_argument(
+        "--list", action="store_true", help="List the snapshots that would be used"
+    )
+    parser.add_argument(
+        "--site", action="append", help="Site to restore, all backed up by default"
+    )
+    parser.add_argument(
+        "--before",
+        type=parse_time,
+        help="Use the latest snapshots taken before this ISO time",
+    )
+    parser.add_argument(
+        "--jobs", type=int, default=4, help="Sites restored at the same time"
+    )
+    parser.add_argument("--bench-path", default=BENCH_PATH)
+    parser.add_argument("--db-root-username")
+    parser.add_argument("--db-root-password", default=os.getenv("DB_ROOT_PASSWORD"))
+    parser.add_argument(
+        "--check-url",
+        default=CHECK_URL,
+        help="Backend every restored site is checked on, empty to skip",
+    )
+    parser.add_argument("--check-timeout", type=float, default=60)
+    parser.add_argument("--report", help="Write the per-site report to this JSON file")
+    args = parser.parse_args(_args)
+
+    try:
+        snapshots = list_snapshots()
+    except subprocess.CalledProcessError:
+        return 1
+    selected = select_snapshots(snapshots, args.before)
+    if args.site:
+        missing = set(args.site) - set(selected)
+        if missing:
+            print(f"No snapshots of {', '.join(sorted(missing))}", file=sys.stderr)
+            return 1
+        selected = {site: selected[site] for site in args.site}
+    if args.list:
+        print_snapshots(selected)
+        return 0
+    if not selected:
+        print("No snapshots to restore", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as executor:
+        reports = list(
+            executor.map(
+                lambda item: restore_site(*item, args), sorted(selected.items())
+            )
+        )
+    print_report(reports, time.perf_counter() - start)
+
+    if args.report:
+        with open(args.report, "w") as f:
+            json.dump([asdict(report) for report in reports], f, indent=2)
+    return 0 if all(report.ok for report in reports) else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Runs `bench worker` processes for a set of queues and scales their number
+between a minimum and a maximum with the number of pending jobs in redis-queue.
+
+Workers are drained on scale down: they get SIGTERM, which makes RQ finish the
+current job before exiting, and are killed only after --drain-timeout.
+Queue depth and scale events are printed as JSON lines, and optionally written
+to a Prometheus textfile with --metrics-file.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlparse
+
+from resource_limits import CGROUP_ROOT, Limits, get_limits
+
+BENCH_PATH = "/home/frappe/frappe-bench"
+CONFIG_PATH = f"{BENCH_PATH}/sites/common_site_config.json"
+QUEUE_KEY_PREFIX = "rq:queue:"
+
+# Rough resident size of an idle Frappe worker
+WORKER_MEMORY = 256 * 1024 * 1024
+# Maximum without cgroup limits, like the backend's gunicorn workers
+UNLIMITED_MAX = 2
+
+Emit = Callable[..., None]
+
+
+class RedisError(Exception):
+    pass
+
+
+class Redis:
+    """
+    Just enough of the redis protocol to read queue lengths, without redis-py.
+    """
+
+    def __init__(self, url: str, timeout: float = 5):
+        self.url = urlparse(url)
+        self.timeout = timeout
+        self.sock: socket.socket | None = None
+        self.file = None
+
+    def connect(self) -> None:
+        self.sock = socket.create_connection(
+            (self.url.hostname or "localhost", self.url.port or 6379),
+            timeout=self.timeout,
+        )
+        self.file = self.sock.makefile("rb")
+        if self.url.password:
+            self.execute("AUTH", self.url.password)
+        db = self.url.path.strip("/")
+        if db and db != "0":
+            self.execute("SELECT", db)
+
+    def close(self) -> None:
+        if self.sock:
+            self.sock.close()
+        self.sock = self.file = None
+
+    def execute(self, *args: str):
+        if not self.sock:
+            self.connect()
+        assert self.sock
+        command = [f"*{len(args)}\r\n".encode()]
+        for arg in args:
+            value = str(arg).encode()
+            command.append(b"$%d\r\n%s\r\n" % (len(value), value))
+        self.sock.sendall(b"".join(command))
+        return self.read_reply()
+
+    def read_reply(self):
+        assert self.file
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by redis")
+        kind, value = line[:1], line[1:-2]
+        if kind == b"+":
+            return value.decode()
+        if kind == b"-":
+            raise RedisError(value.decode())
+        if kind == b":":
+            return int(value)
+        if kind == b"$":
+            if int(value) < 0:
+                return None
+            return self.file.read(int(value) + 2)[:-2].decode()
+        if kind == b"*":
+            return [self.read_reply() for _ in range(int(value))]
+        raise RedisError(f"Unknown reply: {line!r}")
+
+
+def get_redis_url(config_path: str) -> str:
+    with open(config_path) as f:
+        return json.load(f)["redis_queue"]
+
+
+def get_queue_depths(redis: Redis, queues: list[str]) -> dict[str, int]:
+    # Frappe namespaces queues with the bench id, e.g. rq:queue:<bench>:long
+    depths = dict.fromkeys(queues, 0)
+    cursor = "0"
+    while True:
+        cursor, keys = redis.execute(
+            "SCAN", cursor, "MATCH", f"{QUEUE_KEY_PREFIX}*", "COUNT", "1000"
+        )
+        for key in keys:
+            queue = key[len(QUEUE_KEY_PREFIX) :].rsplit(":", 1)[-1]
+            if queue in depths:
+                depths[queue] += redis.execute("LLEN", key)
+        if cursor == "0":
+            return depths
+
+
+def get_default_max(limits: Limits) -> int:
+    if not limits.limited:
+        return UNLIMITED_MAX
+    return max(1, min(2 * math.ceil(limits.cpus), limits.memory // WORKER_MEMORY))
+
+
+class Supervisor:
+    def __init__(
+        self,
+        command: list[str],
+        cwd: str,
+        minimum: int,
+        maximum: int,
+        jobs_per_worker: int,
+        scale_down_delay: float,
+        drain_timeout: float,
+        emit: Emit,
+    ):
+        self.command = command
+        self.cwd = cwd
+        self.minimum = minimum
+        self.maximum = maximum
+        self.jobs_per_worker = jobs_per_worker
+        self.scale_down_delay = scale_down_delay
+        self.drain_timeout = drain_timeout
+        self.emit = emit
+        self.workers: list[subprocess.Popen] = []
+        self.draining: dict[subprocess.Popen, float] = {}
+        self.scale_events = {"up": 0, "down": 0}
+        self.below_since: float | None = None
+
+    def get_desired(self, depth: int) -> int:
+        desired = math.ceil(depth / self.jobs_per_worker)
+        return max(self.minimum, min(self.maximum, desired))
+
+    def start_worker(self) -> None:
+        # Own process group, so signals reach the worker behind `bench`
+        proc = subprocess.Popen(self.command, cwd=self.cwd, start_new_session=True)
+        self.workers.append(proc)
+        self.emit("start", pid=proc.pid)
+
+    def signal_worker(self, proc: subprocess.Popen, signum: int) -> None:
+        try:
+            os.killpg(proc.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def drain_worker(self, proc: subprocess.Popen) -> None:
+        self.workers.remove(proc)
+        self.draining[proc] = time.monotonic() + self.drain_timeout
+        self.signal_worker(proc, signal.SIGTERM)
+        self.emit("drain", pid=proc.pid)
+
+    def scale_to(self, desired: int, depth: int) -> None:
+        current = len(self.workers)
+        if desired == current:
+            return
+        direction = "up" if desired > current else "down"
+        self.scale_events[direction] += 1
+        self.emit(
+            "scale", direction=direction, workers=desired, previous=current, depth=depth
+        )
+        while len(self.workers) < desired:
+            self.start_worker()
+        while len(self.workers) > desired:
+            self.drain_worker(self.workers[-1])
+
+    def update(self, depth: int) -> None:
+        desired = self.get_desired(depth)
+        if desired >= len(self.workers):
+            self.below_since = None
+            self.scale_to(desired, depth)
+            return
+        # Bursts come and go, only scale down after a quiet period
+        now = time.monotonic()
+        if self.below_since is None:
+            self.below_since = now
+        if now - self.below_since >= self.scale_down_delay:
+            self.below_since = None
+            self.scale_to(desired, depth)
+
+    def reap(self) -> None:
+        for proc in list(self.workers):
+            if proc.poll() is not None:
+                self.workers.remove(proc)
+                self.emit("exit", pid=proc.pid, returncode=proc.returncode)
+        self.reap_draining()
+        # Replace crashed workers even while redis is unreachable
+        while len(self.workers) < self.minimum:
+            self.start_worker()
+
+    def reap_draining(self) -> None:
+        for proc, deadline in list(self.draining.items()):
+            if proc.poll() is not None:
+                del self.draining[proc]
+                self.emit("drained", pid=proc.pid, returncode=proc.returncode)
+            elif time.monotonic() > deadline:
+                self.signal_worker(proc, signal.SIGKILL)
+
+    def shutdown(self) -> None:
+        for proc in list(self.workers):
+            self.drain_worker(proc)
+        while self.draining:
+            self.reap_draining()
+            time.sleep(0.1)
+
+
+def get_metrics(depths: dict[str, int], supervisor: Supervisor, queues: str) -> str:
+    labels = f'queues="{queues}"'
+    lines = [
+        "# TYPE frappe_worker_queue_depth gauge",
+        *(
+            f'frappe_worker_queue_depth{{queue="{queue}"}} {depth}'
+            for queue, depth in depths.items()
+        ),
+        "# TYPE frappe_worker_processes gauge",
+        f"frappe_worker_processes{{{labels}}} {len(supervisor.workers)}",
+        "# TYPE frappe_worker_processes_draining gauge",
+        f"frappe_worker_processes_draining{{{labels}}} {len(supervisor.draining)}",
+        "# TYPE frappe_worker_scale_events_total counter",
+        *(
+            f"frappe_worker_scale_events_total"
+            f'{{{labels},direction="{direction}"}} {count}'
+            for direction, count in supervisor.scale_events.items()
+        ),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+def write_atomic(path: str, content: str) -> None:
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def emit(event: str, **fields) -> None:
+    line = {"time": round(time.time(), 3), "event": event, **fields}
+    print(json.dumps(line), flush=True)
+
+
+def main(_args: list[str]) -> int:
+    parser = argparse.ArgumentParser(
+        description="Scale bench workers with the queue depth in redis-queue"
+    )
+    parser.add_argument(
+        "--queue", required=True, help="Comma separated queues, as for bench worker"
+    )
+    parser.add_argument(
+        "--min", type=int, default=int(os.getenv("WORKER_MIN_PROCESSES") or 1)
+    )
+    parser.add_argument(
+        "--max",
+        type=int,
+        default=int(os.getenv("WORKER_MAX_PROCESSES") or 0),
+        help="Defaults to 2 per CPU, capped at one per 256MiB of memory",
+    )
+    parser.add_argument(
+        "--jobs-per-worker",
+        type=int,
+        default=int(os.getenv("WORKER_JOBS_PER_PROCESS") or 10),
+        help="Pending jobs that justify another worker",
+    )
+    parser.add_argument(
+        "--interval", type=float, default=5, help="Seconds between checks"
+    )
+    parser.add_argument(
+        "--scale-down-delay",
+        type=float,
+        default=60,
+        help="Seconds the queue has to stay low before workers are drained",
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=float(os.getenv("WORKER_DRAIN_TIMEOUT") or 1500),
+        help="Seconds a draining worker may take to finish its job",
+    )
+    parser.add_argument("--redis-url", help="Defaults to redis_queue from --config")
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument("--bench-path", default=BENCH_PATH)
+    parser.add_argument("--cgroup-root", default=CGROUP_ROOT)
+    parser.add_argument("--metrics-file", default=os.getenv("WORKER_METRICS_FILE"))
+    parser.add_argument(
+        "command",
+        nargs=argparse.REMAINDER,
+        help="Worker command after --, `bench worker --queue <queue>` by default",
+    )
+    args = parser.parse_args(_args)
+
+    queues = args.queue.split(",")
+    command = args.command[1:] if args.command[:1] == ["--"] else args.command
+    command = command or ["bench", "worker", "--queue", args.queue]
+    maximum = args.max or get_default_max(get_limits(args.cgroup_root))
+    if not 1 <= args.min <= maximum:
+        print(f"Invalid bounds: min {args.min}, max {maximum}", file=sys.stderr)
+        return 1
+
+    redis = Redis(args.redis_url or get_redis_url(args.config))
+    supervisor = Supervisor(
+        command,
+        cwd=args.bench_path,
+        minimum=args.min,
+        maximum=maximum,
+        jobs_per_worker=args.jobs_per_worker,
+        scale_down_delay=args.scale_down_delay,
+        drain_timeout=args.drain_timeout,
+        emit=emit,
+    )
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stop.set())
+
+    emit("config", queues=queues, min=args.min, max=maximum, command=command)
+    depths = dict.fromkeys(queues, 0)
+    while not stop.is_set():
+        supervisor.reap()
+        try:
+            new_depths = get_queue_depths(redis, queues)
+        except (OSError, RedisError) as e:
+            emit("error", error=f"{type(e).__name__}: {e}")
+            redis.close()
+        else:
+            if new_depths != depths:
+                emit("depth", depths=new_depths)
+            depths = new_depths
+            supervisor.update(sum(depths.values()))
+        if args.metrics_file:
+            write_atomic(args.metrics_file, get_metrics(depths, supervisor, args.queue))
+        stop.wait(args.interval)
+
+    emit("shutdown", workers=len(supervisor.workers))
+    supervisor.shutdown()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
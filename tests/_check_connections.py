@@ -1,25 +1,185 @@
 from __future__ import annotations
 
+import argparse
 import asyncio
 import json
+import os
 import socket
-from typing import Any, Iterable, Tuple
+import struct
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Any, Awaitable, Callable, Iterable, Tuple
+
+from _stats import percentile
 
 Address = Tuple[str, int]
+Probe = Callable[[asyncio.StreamReader, asyncio.StreamWriter, str], Awaitable[str]]
 
+CONFIG_PATH = "/home/frappe/frappe-bench/sites/common_site_config.json"
+# Postgres SSLRequest code, server answers with a single "S" or "N"
+PG_SSL_REQUEST = struct.pack("!ii", 8, 80877103)
 
-async def wait_for_port(address: Address) -> None:
-    # From https://github.com/clarketm/wait-for-it
-    while True:
+
+class ProbeError(Exception):
+    pass
+
+
+PROBE_ERRORS = (
+    socket.gaierror,
+    ConnectionError,
+    OSError,
+    TypeError,
+    asyncio.IncompleteReadError,
+    asyncio.TimeoutError,
+    ProbeError,
+)
+
+
+@dataclass
+class Dependency:
+    name: str
+    protocol: str
+    host: str
+    port: int
+
+
+@dataclass
+class ProbeResult:
+    name: str
+    protocol: str
+    host: str
+    port: int
+    ready: bool = False
+    time_to_ready_ms: float | None = None
+    server: str | None = None
+    error: str | None = None
+    latency_ms: dict[str, float] = field(default_factory=dict)
+    # Latency samples that failed after the dependency was ready
+    failed_samples: int = 0
+    sample_error: str | None = None
+
+
+async def probe_redis(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str
+) -> str:
+    writer.write(b"PING\r\n")
+    await writer.drain()
+    line = await reader.readline()
+    if not line.startswith(b"+PONG"):
+        raise ProbeError(f"Unexpected PING reply: {line!r}")
+    return "redis"
+
+
+async def probe_mysql(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str
+) -> str:
+    # Server speaks first with a handshake packet: 3 byte length, 1 byte sequence
+    header = await reader.readexactly(4)
+    payload = await reader.readexactly(int.from_bytes(header[:3], "little"))
+    if payload[0] == 0xFF:
+        raise ProbeError(payload[3:].decode(errors="replace"))
+    if payload[0] != 10:
+        raise ProbeError(f"Unknown protocol version {payload[0]}")
+    return payload[1 : payload.index(0, 1)].decode(errors="replace")
+
+
+async def probe_postgres(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str
+) -> str:
+    writer.write(PG_SSL_REQUEST)
+    await writer.drain()
+    reply = await reader.readexactly(1)
+    if reply not in (b"S", b"N"):
+        raise ProbeError(f"Unexpected SSLRequest reply: {reply!r}")
+    return "postgres"
+
+
+async def probe_socketio(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, host: str
+) -> str:
+    writer.write(
+        (
+            "GET /socket.io/?EIO=4&transport=polling HTTP/1.1\r\n"
+            f"Host: {host}\r\nConnection: close\r\n\r\n"
+        ).encode()
+    )
+    await writer.drain()
+    line = await reader.readline()
+    if not line.startswith(b"HTTP/"):
+        raise ProbeError(f"Unexpected HTTP reply: {line!r}")
+    return line.decode().strip()
+
+
+PROBES: dict[str, Probe] = {
+    "redis": probe_redis,
+    "mysql": probe_mysql,
+    "postgres": probe_postgres,
+    "socketio": probe_socketio,
+}
+
+
+async def probe_once(dependency: Dependency, timeout: float) -> str:
+    reader, writer = await asyncio.wait_for(
+        asyncio.open_connection(dependency.host, dependency.port), timeout=timeout
+    )
+    try:
+        return await asyncio.wait_for(
+            PROBES[dependency.protocol](reader, writer, dependency.host),
+            timeout=timeout,
+        )
+    finally:
+        writer.close()
         try:
-            _, writer = await asyncio.open_connection(*address)
-            writer.close()
             await writer.wait_closed()
-            break
-        except (socket.gaierror, ConnectionError, OSError, TypeError):
+        except OSError:
             pass
+
+
+async def check_dependency(
+    dependency: Dependency, timeout: float, samples: int
+) -> ProbeResult:
+    result = ProbeResult(**asdict(dependency))
+    start = time.perf_counter()
+    deadline = start + timeout
+
+    # From https://github.com/clarketm/wait-for-it, with a handshake on top
+    while True:
+        try:
+            result.server = await probe_once(
+                dependency, timeout=max(deadline - time.perf_counter(), 0.1)
+            )
+            break
+        except PROBE_ERRORS as exc:
+            result.error = f"{type(exc).__name__}: {exc}"
+        if time.perf_counter() + 0.1 > deadline:
+            return result
         await asyncio.sleep(0.1)
 
+    result.ready = True
+    result.error = None
+    result.time_to_ready_ms = round((time.perf_counter() - start) * 1000, 2)
+
+    latencies: list[float] = []
+    for _ in range(samples):
+        sample_start = time.perf_counter()
+        try:
+            await probe_once(dependency, timeout=timeout)
+        except PROBE_ERRORS as exc:
+            # Reported with this dependency, the others are still checked
+            result.failed_samples += 1
+            result.sample_error = f"{type(exc).__name__}: {exc}"
+            continue
+        latencies.append((time.perf_counter() - sample_start) * 1000)
+    if latencies:
+        latencies.sort()
+        result.latency_ms = {
+            "min": round(latencies[0], 2),
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "max": round(latencies[-1], 2),
+        }
+    return result
+
 
 def get_redis_url(addr: str) -> Address:
     result = addr.replace("redis://", "")
@@ -29,23 +189,80 @@ def get_redis_url(addr: str) -> Address:
     return parts[0], int(parts[1])
 
 
-def get_addresses(config: dict[str, Any]) -> Iterable[Address]:
-    yield (config["db_host"], config["db_port"])
+def get_db_protocol(config: dict[str, Any]) -> str:
+    db_type = config.get("db_type")
+    if db_type == "postgres" or (not db_type and int(config["db_port"]) == 5432):
+        return "postgres"
+    return "mysql"
+
+
+def get_dependencies(
+    config: dict[str, Any], socketio_host: str | None
+) -> Iterable[Dependency]:
+    yield Dependency(
+        "db", get_db_protocol(config), config["db_host"], int(config["db_port"])
+    )
     for key in ("redis_cache", "redis_queue"):
-        yield get_redis_url(config[key])
+        yield Dependency(key, "redis", *get_redis_url(config[key]))
+    if socketio_host and config.get("socketio_port"):
+        yield Dependency(
+            "socketio", "socketio", socketio_host, int(config["socketio_port"])
+        )
 
 
-async def async_main(addresses: set[Address]) -> None:
-    tasks = [asyncio.wait_for(wait_for_port(addr), timeout=5) for addr in addresses]
-    await asyncio.gather(*tasks)
+async def async_main(
+    dependencies: list[Dependency], timeout: float, samples: int
+) -> list[ProbeResult]:
+    tasks = [check_dependency(dep, timeout, samples) for dep in dependencies]
+    return await asyncio.gather(*tasks)
+
+
+def print_results(results: list[ProbeResult]) -> None:
+    for result in results:
+        target = f"{result.name} ({result.protocol} {result.host}:{result.port})"
+        if not result.ready:
+            print(f"{target}: not ready, {result.error}")
+            continue
+        latency = ", ".join(f"{k} {v}ms" for k, v in result.latency_ms.items())
+        if result.failed_samples:
+            latency += (
+                f"{', ' if latency else ''}{result.failed_samples} samples failed, "
+                f"last {result.sample_error}"
+            )
+        print(f"{target}: ready in {result.time_to_ready_ms}ms, {latency}")
 
 
 def main() -> int:
-    with open("/home/frappe/frappe-bench/sites/common_site_config.json") as f:
+    parser = argparse.ArgumentParser(
+        description="Check that db, redis and socketio from common_site_config.json "
+        "answer their protocol handshake and measure round-trip latency"
+    )
+    parser.add_argument("--config", default=CONFIG_PATH)
+    parser.add_argument(
+        "--timeout", type=float, default=5, help="Seconds to wait per dependency"
+    )
+    parser.add_argument(
+        "--samples", type=int, default=5, help="Latency samples per dependency"
+    )
+    parser.add_argument(
+        "--socketio-host",
+        default=os.getenv("SOCKETIO_HOST"),
+        help="Also probe socketio_port on this host",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    with open(args.config) as f:
         config = json.load(f)
-    addresses = set(get_addresses(config))
-    asyncio.run(async_main(addresses))
-    return 0
+    dependencies = list(get_dependencies(config, args.socketio_host))
+    results = asyncio.run(async_main(dependencies, args.timeout, args.samples))
+
+    if args.json:
+        print(json.dumps([asdict(result) for result in results], indent=2))
+    else:
+        print_results(results)
+    ok = all(result.ready and not result.failed_samples for result in results)
+    return 0 if ok else 1
 
 
 if __name__ == "__main__":
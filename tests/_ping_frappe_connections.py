@@ -1,4 +1,10 @@
+import argparse
+import json
+import time
+from typing import Callable, Dict, List
+
 import frappe
+from _stats import percentile
 
 
 def check_db():
@@ -15,10 +21,92 @@ def check_cache():
     print("Cache works!")
 
 
+def cached_doc_read():
+    frappe.get_cached_doc("System Settings")
+
+
+def db_select():
+    frappe.db.sql("select name from `tabDocType` limit 1")
+
+
+def cache_set_get():
+    frappe.cache().set_value("benchmark_key", "benchmark_value")
+    frappe.cache().get_value("benchmark_key")
+
+
+def cache_pipeline():
+    cache = frappe.cache()
+    keys = [cache.make_key(f"benchmark_pipeline_{i}") for i in range(10)]
+    pipeline = cache.pipeline()
+    for i, key in enumerate(keys):
+        pipeline.set(key, i)
+    for key in keys:
+        pipeline.get(key)
+    pipeline.execute()
+
+
+BENCHMARKS: Dict[str, Callable[[], None]] = {
+    "cached_doc_read": cached_doc_read,
+    "db_select": db_select,
+    "cache_set_get": cache_set_get,
+    "cache_pipeline": cache_pipeline,
+}
+
+
+def run_benchmark(func: Callable[[], None], iterations: int) -> Dict[str, float]:
+    # Warm up connections and caches
+    func()
+    latencies = []
+    start = time.perf_counter()
+    for _ in range(iterations):
+        op_start = time.perf_counter()
+        func()
+        latencies.append((time.perf_counter() - op_start) * 1000)
+    duration = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "ops_per_sec": round(iterations / duration, 1),
+        "p50_ms": round(percentile(latencies, 50), 3),
+        "p95_ms": round(percentile(latencies, 95), 3),
+        "p99_ms": round(percentile(latencies, 99), 3),
+    }
+
+
+def benchmark(iterations: int) -> Dict[str, Dict[str, float]]:
+    results = {name: run_benchmark(func, iterations) for name, func in BENCHMARKS.items()}
+    frappe.cache().delete_value(
+        ["benchmark_key"] + [f"benchmark_pipeline_{i}" for i in range(10)]
+    )
+    return results
+
+
 def main() -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--benchmark",
+        type=int,
+        metavar="ITERATIONS",
+        help="Measure db and cache operations instead of a single check",
+    )
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
     frappe.connect(site="tests.localhost")
-    check_db()
-    check_cache()
+    if not args.benchmark:
+        check_db()
+        check_cache()
+        return 0
+
+    results = benchmark(args.benchmark)
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for name, result in results.items():
+            print(
+                f"{name}: {result['ops_per_sec']} ops/s, p50 {result['p50_ms']}ms, "
+                f"p95 {result['p95_ms']}ms, p99 {result['p99_ms']}ms"
+            )
     return 0
 
 
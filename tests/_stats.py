@@ -0,0 +1,15 @@
+"""
+Statistics shared by the benchmarks and the scripts run inside the containers,
+which get a copy of this file next to them, see run_script_in_services.
+"""
+
+import math
+from typing import List
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of sorted values."""
+    if not values:
+        return 0.0
+    index = max(0, math.ceil(pct / 100 * len(values)) - 1)
+    return values[index]
@@ -0,0 +1,217 @@
+"""
+HTTP load benchmark for a running stack.
+
+Results of a run can be compared with a previous one:
+
+    python -m tests.benchmark baseline.json current.json --threshold 0.1
+"""
+
+import argparse
+import asyncio
+import json
+import ssl
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from tests._stats import percentile
+from tests.utils import get_ssl_context
+
+
+@dataclass
+class BenchmarkResult:
+    url: str
+    site_name: str
+    concurrency: int
+    requests: int
+    errors: int
+    duration: float
+    rps: float
+    # Latencies are in milliseconds
+    p50: float
+    p95: float
+    p99: float
+
+
+class HTTPClient:
+    """Minimal keep-alive HTTP/1.1 client, one connection per instance."""
+
+    def __init__(self, url: str, site_name: str):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl: Optional[ssl.SSLContext] = (
+            get_ssl_context() if parts.scheme == "https" else None
+        )
+        path = parts.path or "/"
+        if parts.query:
+            path += f"?{parts.query}"
+        self.request = (
+            f"GET {path} HTTP/1.1\r\nHost: {site_name}\r\nConnection: keep-alive\r\n\r\n"
+        ).encode()
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def close(self) -> None:
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (OSError, ssl.SSLError):
+                pass
+        self.reader = self.writer = None
+
+    async def get(self) -> int:
+        if not self.writer:
+            self.reader, self.writer = await asyncio.open_connection(
+                self.host, self.port, ssl=self.ssl
+            )
+        assert self.reader
+        self.writer.write(self.request)
+        await self.writer.drain()
+
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers: Dict[str, str] = {}
+        while True:
+            line = (await self.reader.readline()).decode("latin-1").strip()
+            if not line:
+                break
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+        if headers.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        else:
+            await self.reader.read()
+            await self.close()
+
+        if headers.get("connection") == "close":
+            await self.close()
+        return status
+
+
+async def _worker(
+    client: HTTPClient, remaining: List[int], latencies: List[float]
+) -> int:
+    errors = 0
+    while remaining[0] > 0:
+        remaining[0] -= 1
+        start = time.perf_counter()
+        try:
+            status = await client.get()
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError):
+            await client.close()
+            errors += 1
+            continue
+        if status >= 400:
+            errors += 1
+        else:
+            latencies.append((time.perf_counter() - start) * 1000)
+    await client.close()
+    return errors
+
+
+async def run_benchmark_async(
+    url: str, site_name: str, concurrency: int = 10, requests: int = 500
+) -> BenchmarkResult:
+    remaining = [requests]
+    latencies: List[float] = []
+    start = time.perf_counter()
+    errors = await asyncio.gather(
+        *(
+            _worker(HTTPClient(url, site_name), remaining, latencies)
+            for _ in range(concurrency)
+        )
+    )
+    duration = time.perf_counter() - start
+    latencies.sort()
+    return BenchmarkResult(
+        url=url,
+        site_name=site_name,
+        concurrency=concurrency,
+        requests=requests,
+        errors=sum(errors),
+        duration=round(duration, 3),
+        rps=round(len(latencies) / duration, 1),
+        p50=round(percentile(latencies, 50), 2),
+        p95=round(percentile(latencies, 95), 2),
+        p99=round(percentile(latencies, 99), 2),
+    )
+
+
+def run_benchmark(
+    url: str, site_name: str, concurrency: int = 10, requests: int = 500
+) -> BenchmarkResult:
+    result = asyncio.run(run_benchmark_async(url, site_name, concurrency, requests))
+    print(
+        f"{url}: {result.rps} rps, p50 {result.p50}ms, p95 {result.p95}ms, "
+        f"p99 {result.p99}ms, {result.errors} errors"
+    )
+    return result
+
+
+def save_results(results: List[BenchmarkResult], path: str) -> None:
+    with open(path, "w") as f:
+        json.dump([asdict(result) for result in results], f, indent=2)
+
+
+def load_results(path: str) -> List[BenchmarkResult]:
+    with open(path) as f:
+        return [BenchmarkResult(**result) for result in json.load(f)]
+
+
+def compare_results(
+    baseline: List[BenchmarkResult],
+    current: List[BenchmarkResult],
+    threshold: float = 0.1,
+) -> List[str]:
+    """Returns regressions of current results larger than threshold."""
+    previous: Dict[Tuple[str, str], BenchmarkResult] = {
+        (result.url, result.site_name): result for result in baseline
+    }
+    regressions: List[str] = []
+    for result in current:
+        old = previous.get((result.url, result.site_name))
+        if not old:
+            continue
+        if result.rps < old.rps * (1 - threshold):
+            regressions.append(f"{result.url}: rps {old.rps} -> {result.rps}")
+        for field in ("p50", "p95", "p99"):
+            old_value, new_value = getattr(old, field), getattr(result, field)
+            if new_value > old_value * (1 + threshold):
+                regressions.append(
+                    f"{result.url}: {field} {old_value}ms -> {new_value}ms"
+                )
+        if result.errors > old.errors:
+            regressions.append(f"{result.url}: errors {old.errors} -> {result.errors}")
+    return regressions
+
+
+def main(_args: List[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args(_args)
+
+    regressions = compare_results(
+        load_results(args.baseline), load_results(args.current), args.threshold
+    )
+    for regression in regressions:
+        print(regression)
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
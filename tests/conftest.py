@@ -1,51 +1,192 @@
+import hashlib
+import importlib.util
 import os
-import re
 import shutil
 import subprocess
+import sys
 from dataclasses import dataclass
 from pathlib import Path
+from typing import List, Optional
 
 import pytest
 
-from tests.utils import CI, Compose
+from tests.utils import CI, Compose, DirectCompose, readiness
 
 
-def _add_version_var(name: str, env_path: Path):
+ROOT = Path(__file__).resolve().parent.parent
+STACK_CACHE_KEY = "frappe_docker/stack_key"
+
+
+def pytest_addoption(parser: pytest.Parser):
+    parser.addoption(
+        "--reuse-stack",
+        action="store_true",
+        help="Share a running stack between setup fixtures if its config matches",
+    )
+    parser.addoption(
+        "--keep-stack",
+        action="store_true",
+        help="Leave the stack running for the next pytest run (implies --reuse-stack)",
+    )
+    parser.addoption(
+        "--benchmark", action="store_true", help="Run HTTP load benchmarks"
+    )
+    parser.addoption("--benchmark-concurrency", type=int, default=10)
+    parser.addoption("--benchmark-requests", type=int, default=500)
+    parser.addoption(
+        "--benchmark-output",
+        default="benchmark.json",
+        help="Where to save benchmark results",
+    )
+    parser.addoption(
+        "--benchmark-baseline",
+        default=None,
+        help="Previous benchmark results to check for regressions",
+    )
+    parser.addoption(
+        "--benchmark-threshold",
+        type=float,
+        default=0.1,
+        help="Allowed relative regression against baseline",
+    )
+
+
+def pytest_configure(config: pytest.Config):
+    config.addinivalue_line("markers", "benchmark: HTTP load benchmark")
+
+
+def pytest_collection_modifyitems(config: pytest.Config, items: List[pytest.Item]):
+    if config.getoption("benchmark"):
+        return
+    skip = pytest.mark.skip(reason="Needs --benchmark option to run")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not readiness.time_to_ready:
+        return
+    terminalreporter.section("time to ready")
+    for (site_name, url), elapsed in sorted(
+        readiness.time_to_ready.items(), key=lambda item: item[1], reverse=True
+    ):
+        terminalreporter.write_line(f"{elapsed:8.2f}s  {site_name}  {url}")
+
+
+class Stack:
+    """
+    Brings the test stack up with extra compose files. Without reuse every
+    setup starts from a fresh stack with clean volumes, with reuse a running
+    stack started from the same files, env and images is kept as is.
+    Without pytest's cache provider a stack is never reused.
+    """
+
+    def __init__(
+        self,
+        compose: DirectCompose,
+        env_file: str,
+        cache: Optional[pytest.Cache],
+        reuse: bool,
+        keep: bool,
+    ):
+        self.compose = compose
+        self.env_file = env_file
+        self.cache = cache
+        self.reuse = cache is not None and (reuse or keep)
+        self.keep = keep
+        self.key: Optional[str] = None
+        if self.reuse and cache is not None:
+            self.key = cache.get(STACK_CACHE_KEY, None)
+
+    def get_key(self, file_args: List[str]) -> str:
+        """
+        Hash of the rendered env file and of the config compose renders with
+        it, the extra files and the environment, image tags included
+        """
+        digest = hashlib.sha256(Path(self.env_file).read_bytes())
+        config = subprocess.check_output(
+            (*self.compose.base_cmd, *self.compose.file_args, *file_args, "config"),
+            encoding="UTF-8",
+        )
+        digest.update(config.encode())
+        return digest.hexdigest()
+
+    def set_key(self, key: Optional[str]) -> None:
+        self.key = key
+        if self.cache is not None:
+            self.cache.set(STACK_CACHE_KEY, key)
+
+    def up(self, *files: str) -> None:
+        file_args = [arg for file in files for arg in ("-f", file)]
+        key = self.get_key(file_args)
+        if self.reuse and self.key == key and self.compose.containers:
+            return
+        self.stop()
+        self.compose(*file_args, "up", "-d", "--quiet-pull")
+        self.set_key(key)
+
+    def release(self) -> None:
+        if not self.reuse:
+            self.stop()
+
+    def stop(self) -> None:
+        self.compose.stop()
+        self.set_key(None)
+
+    @property
+    def new_site_args(self) -> List[str]:
+        # Sites survive in a reused stack, recreate them to reset state
+        return ["--force"] if self.reuse else []
+
+
+def _load_render_config():
+    path = ROOT / ".github" / "scripts" / "render_config.py"
+    spec = importlib.util.spec_from_file_location("render_config", path)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    # dataclasses look the module up by name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+render_config = _load_render_config()
+
+
+def _version_update(name: str, env_path: Path):
     value = os.getenv(name)
 
     if not value:
-        return
+        return None
 
     if value == "develop":
         os.environ[name] = "latest"
 
-    with open(env_path, "a") as f:
-        f.write(f"\n{name}={os.environ[name]}")
+    return render_config.env_var(str(env_path), name, os.environ[name])
 
 
-def _add_sites_var(env_path: Path):
-    with open(env_path, "r+") as f:
-        content = f.read()
-        content = re.sub(
-            rf"SITES=.*",
-            f"SITES=`tests.localhost`,`test-erpnext-site.localhost`,`test-pg-site.localhost`",
-            content,
-        )
-        f.seek(0)
-        f.truncate()
-        f.write(content)
+def _sites_update(env_path: Path):
+    return render_config.env_var(
+        str(env_path),
+        "SITES",
+        "`tests.localhost`,`test-erpnext-site.localhost`,`test-pg-site.localhost`,"
+        "`test-restore-site.localhost`",
+    )
 
 
 @pytest.fixture(scope="session")
 def env_file(tmp_path_factory: pytest.TempPathFactory):
     tmp_path = tmp_path_factory.mktemp("frappe-docker")
     file_path = tmp_path / ".env"
-    shutil.copy("example.env", file_path)
-
-    _add_sites_var(file_path)
+    shutil.copy(ROOT / "example.env", file_path)
 
+    updates = [_sites_update(file_path)]
     for var in ("FRAPPE_VERSION", "ERPNEXT_VERSION"):
-        _add_version_var(name=var, env_path=file_path)
+        update = _version_update(name=var, env_path=file_path)
+        if update:
+            updates.append(update)
+    render_config.render(updates)
 
     yield str(file_path)
     os.remove(file_path)
@@ -53,21 +194,34 @@ def env_file(tmp_path_factory: pytest.TempPathFactory):
 
 @pytest.fixture(scope="session")
 def compose(env_file: str):
-    return Compose(project_name="test", env_file=env_file)
+    return DirectCompose(project_name="test", env_file=env_file)
 
 
-@pytest.fixture(autouse=True, scope="session")
-def frappe_setup(compose: Compose):
-    compose.stop()
+@pytest.fixture(scope="session")
+def stack(compose: DirectCompose, env_file: str, pytestconfig: pytest.Config):
+    stack = Stack(
+        compose=compose,
+        env_file=env_file,
+        # Missing with -p no:cacheprovider
+        cache=getattr(pytestconfig, "cache", None),
+        reuse=pytestconfig.getoption("reuse_stack"),
+        keep=pytestconfig.getoption("keep_stack"),
+    )
+    yield stack
+    if not stack.keep:
+        stack.stop()
+
 
-    compose("up", "-d", "--quiet-pull")
+# Used by the modules that test the stack, unit tests run without docker
+@pytest.fixture(scope="session")
+def frappe_setup(stack: Stack):
+    stack.up()
     yield
-
-    compose.stop()
+    stack.release()
 
 
 @pytest.fixture(scope="session")
-def frappe_site(compose: Compose):
+def frappe_site(compose: Compose, stack: Stack):
     site_name = "tests.localhost"
     compose.bench(
         "new-site",
@@ -75,23 +229,51 @@ def frappe_site(compose: Compose):
         "--no-mariadb-socket",
         "--db-root-password=123",
         "--admin-password=admin",
+        *stack.new_site_args,
         site_name,
     )
     compose("restart", "backend")
     yield site_name
 
 
-@pytest.fixture(scope="class")
-def erpnext_setup(compose: Compose):
-    compose.stop()
-    compose("up", "-d", "--quiet-pull")
+@pytest.fixture
+def restore_site(compose: Compose, stack: Stack):
+    """A site of its own for tests that destroy it"""
+    site_name = "test-restore-site.localhost"
+    compose.bench(
+        "new-site",
+        "--no-mariadb-socket",
+        "--db-root-password=123",
+        "--admin-password=admin",
+        *stack.new_site_args,
+        site_name,
+    )
+    compose("restart", "backend")
+    yield site_name
+    compose.bench(
+        "drop-site", "--force", "--no-backup", "--db-root-password=123", site_name
+    )
+
 
+@pytest.fixture
+def proxy_cache(compose: Compose, monkeypatch: pytest.MonkeyPatch):
+    # Environment variables override the env file
+    monkeypatch.setenv("PROXY_CACHE", "on")
+    compose("up", "-d", "frontend")
     yield
-    compose.stop()
+    monkeypatch.undo()
+    compose("up", "-d", "frontend")
 
 
 @pytest.fixture(scope="class")
-def erpnext_site(compose: Compose):
+def erpnext_setup(stack: Stack):
+    stack.up()
+    yield
+    stack.release()
+
+
+@pytest.fixture(scope="class")
+def erpnext_site(compose: Compose, stack: Stack):
     site_name = "test-erpnext-site.localhost"
     args = [
         "new-site",
@@ -100,6 +282,7 @@ def erpnext_site(compose: Compose):
         "--db-root-password=123",
         "--admin-password=admin",
         "--install-app=erpnext",
+        *stack.new_site_args,
         site_name,
     ]
     compose.bench(*args)
@@ -108,13 +291,12 @@ def erpnext_site(compose: Compose):
 
 
 @pytest.fixture
-def postgres_setup(compose: Compose):
-    compose.stop()
-    compose("-f", "overrides/compose.postgres.yaml", "up", "-d", "--quiet-pull")
+def postgres_setup(compose: Compose, stack: Stack):
+    stack.up("overrides/compose.postgres.yaml")
     compose.bench("set-config", "-g", "root_login", "postgres")
     compose.bench("set-config", "-g", "root_password", "123")
     yield
-    compose.stop()
+    stack.release()
 
 
 @pytest.fixture
@@ -164,3 +346,14 @@ def s3_service(python_path: str, compose: Compose):
 
     yield S3ServiceResult(access_key=access_key, secret_key=secret_key)
     subprocess.call(("docker", "rm", "minio", "-f"))
+
+
+@pytest.fixture
+def restic_args(s3_service: S3ServiceResult) -> List[str]:
+    """`docker exec` options for restic with a repository in the MinIO bucket"""
+    return [
+        "--env=RESTIC_REPOSITORY=s3:http://minio:9000/frappe",
+        f"--env=AWS_ACCESS_KEY_ID={s3_service.access_key}",
+        f"--env=AWS_SECRET_ACCESS_KEY={s3_service.secret_key}",
+        "--env=RESTIC_PASSWORD=secret",
+    ]
@@ -0,0 +1,172 @@
+"""
+Size and cold start of the role images against the single erpnext image.
+
+Every role is started from both images on the network and sites volume of a
+running stack, until its port accepts connections or its log says it's ready:
+
+    python -m tests.image_benchmark frappe/erpnext:v15 --network test_default \
+        --volume test_sites --output images.json
+"""
+
+import argparse
+import json
+import socket
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from statistics import median
+from typing import Dict, List, Optional, Tuple
+
+
+@dataclass
+class Role:
+    command: Tuple[str, ...]
+    port: Optional[int] = None
+    log: Optional[str] = None
+    env: Dict[str, str] = field(default_factory=dict)
+
+
+# Same commands as in compose.yaml
+ROLES = {
+    "backend": Role(("/usr/local/bin/gunicorn_launcher.py",), port=8000),
+    "worker": Role(("bench", "worker", "--queue", "short,default"), log="Listening on"),
+    "websocket": Role(
+        ("node", "/home/frappe/frappe-bench/apps/frappe/socketio.js"), port=9000
+    ),
+    "frontend": Role(
+        ("nginx-entrypoint.sh",),
+        port=8080,
+        env={"BACKEND": "backend:8000", "SOCKETIO": "websocket:9000"},
+    ),
+}
+
+
+@dataclass
+class ImageResult:
+    role: str
+    image: str
+    size: int
+    # Seconds from `docker run` until ready, median of the runs
+    start: float
+
+
+def get_role_image(image: str, role: str) -> str:
+    """frappe/erpnext:v15 -> frappe/erpnext-backend:v15, like the bake targets"""
+    repo, sep, tag = image.rpartition(":")
+    if "/" in tag or not sep:
+        repo, tag = image, "latest"
+    return f"{repo}-{role}:{tag}"
+
+
+def image_exists(image: str) -> bool:
+    return not subprocess.call(
+        ("docker", "image", "inspect", image),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+
+def get_image_size(image: str) -> int:
+    output = subprocess.check_output(
+        ("docker", "image", "inspect", "--format", "{{.Size}}", image),
+        encoding="UTF-8",
+    )
+    return int(output)
+
+
+def get_host_port(container: str, port: int) -> int:
+    output = subprocess.check_output(
+        ("docker", "port", container, f"{port}/tcp"), encoding="UTF-8"
+    )
+    return int(output.splitlines()[0].rsplit(":", 1)[1])
+
+
+def is_ready(container: str, role: Role, host_port: Optional[int]) -> bool:
+    if host_port:
+        try:
+            with socket.create_connection(("127.0.0.1", host_port), timeout=1):
+                return True
+        except OSError:
+            return False
+    logs = subprocess.run(
+        ("docker", "logs", container),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        encoding="UTF-8",
+    ).stdout
+    return bool(role.log and role.log in logs)
+
+
+def measure_start(
+    image: str, role: Role, network: str, volume: str, timeout: float = 120
+) -> float:
+    cmd = ["docker", "run", "-d", "--network", network]
+    cmd += ("-v", f"{volume}:/home/frappe/frappe-bench/sites")
+    for name, value in role.env.items():
+        cmd += ("-e", f"{name}={value}")
+    if role.port:
+        cmd += ("-p", f"127.0.0.1::{role.port}")
+
+    start = time.perf_counter()
+    container = subprocess.check_output(
+        (*cmd, image, *role.command), encoding="UTF-8"
+    ).strip()
+    try:
+        host_port = get_host_port(container, role.port) if role.port else None
+        while not is_ready(container, role, host_port):
+            if time.perf_counter() - start > timeout:
+                raise TimeoutError(f"{image} not ready after {timeout}s")
+            time.sleep(0.05)
+        return time.perf_counter() - start
+    finally:
+        subprocess.call(("docker", "rm", "-f", container), stdout=subprocess.DEVNULL)
+
+
+def run_image_benchmark(
+    image: str, network: str, volume: str, runs: int = 3
+) -> List[ImageResult]:
+    results = []
+    for name, role in ROLES.items():
+        for role_image in (image, get_role_image(image, name)):
+            if not image_exists(role_image):
+                print(f"Skipping {name}: {role_image} not found")
+                continue
+            start = median(
+                measure_start(role_image, role, network, volume) for _ in range(runs)
+            )
+            size = get_image_size(role_image)
+            results.append(ImageResult(name, role_image, size, round(start, 2)))
+    print_results(results)
+    return results
+
+
+def print_results(results: List[ImageResult]) -> None:
+    width = max((len(result.image) for result in results), default=5)
+    print(f"\n{'Role':<10}  {'Image':<{width}}  {'Size':>9}  {'Start':>7}")
+    for result in results:
+        size = f"{result.size / 1024**2:.0f}MiB"
+        print(
+            f"{result.role:<10}  {result.image:<{width}}  {size:>9}  "
+            f"{result.start:>6.2f}s"
+        )
+
+
+def main(_args: List[str]) -> int:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("image", help="The single image, e.g. frappe/erpnext:v15")
+    parser.add_argument("--network", required=True, help="Network of a running stack")
+    parser.add_argument("--volume", required=True, help="Its sites volume")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--output", help="Save results to this JSON file")
+    args = parser.parse_args(_args)
+
+    results = run_image_benchmark(args.image, args.network, args.volume, args.runs)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump([asdict(result) for result in results], f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
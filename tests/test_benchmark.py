@@ -0,0 +1,82 @@
+import subprocess
+
+import pytest
+
+from tests.benchmark import compare_results, load_results, run_benchmark, save_results
+from tests.image_benchmark import run_image_benchmark
+from tests.test_frappe_docker import BACKEND_SERVICES, api_cb, assets_cb, index_cb
+from tests.utils import DirectCompose, check_url_content, run_script_in_services
+
+pytestmark = pytest.mark.usefixtures("frappe_setup")
+
+ENDPOINTS = (
+    ("/", index_cb),
+    ("/api/method/ping", api_cb),
+    ("/assets/frappe/images/frappe-framework-logo.svg", assets_cb),
+)
+
+
+@pytest.mark.benchmark
+def test_http_benchmark(frappe_site: str, pytestconfig: pytest.Config):
+    results = []
+    for path, callback in ENDPOINTS:
+        url = f"http://127.0.0.1{path}"
+        check_url_content(url=url, callback=callback, site_name=frappe_site)
+        results.append(
+            run_benchmark(
+                url,
+                frappe_site,
+                concurrency=pytestconfig.getoption("benchmark_concurrency"),
+                requests=pytestconfig.getoption("benchmark_requests"),
+            )
+        )
+    save_results(results, pytestconfig.getoption("benchmark_output"))
+
+    baseline = pytestconfig.getoption("benchmark_baseline")
+    if baseline:
+        regressions = compare_results(
+            load_results(baseline),
+            results,
+            pytestconfig.getoption("benchmark_threshold"),
+        )
+        assert not regressions, "\n".join(regressions)
+
+
+@pytest.mark.benchmark
+@pytest.mark.usefixtures("frappe_site")
+@pytest.mark.parametrize("service", BACKEND_SERVICES)
+def test_frappe_benchmark_in_backends(
+    service: str, python_path: str, compose: DirectCompose, pytestconfig: pytest.Config
+):
+    # One service at a time so they don't skew each other's numbers
+    run_script_in_services(
+        compose,
+        (service,),
+        "_ping_frappe_connections.py",
+        python_path,
+        "-w",
+        "/home/frappe/frappe-bench/sites",
+        script_args=(
+            "--benchmark",
+            str(pytestconfig.getoption("benchmark_requests")),
+        ),
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.usefixtures("frappe_site")
+def test_role_images_benchmark(compose: DirectCompose):
+    backend = compose.containers["backend"]
+    image = subprocess.check_output(
+        ("docker", "inspect", "--format", "{{.Config.Image}}", backend),
+        encoding="UTF-8",
+    ).strip()
+    results = run_image_benchmark(
+        image,
+        network=f"{compose.project_name}_default",
+        volume=f"{compose.project_name}_sites",
+    )
+    sizes = {(result.role, result.image): result.size for result in results}
+    for role, role_image in sizes:
+        if role_image != image:
+            assert sizes[role, role_image] < sizes[role, image], role
@@ -0,0 +1,83 @@
+import importlib.util
+import json
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+SCRIPT = Path(__file__).parent.parent / "images" / "production" / "build_assets.py"
+
+
+def _load_build_assets():
+    spec = importlib.util.spec_from_file_location("build_assets", SCRIPT)
+    assert spec and spec.loader
+    module = importlib.util.module_from_spec(spec)
+    # dataclasses look the module up by name
+    sys.modules[spec.name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+build_assets = _load_build_assets()
+
+
+def write_timings(path: Path, *timings: dict):
+    with path.open("w") as f:
+        for timing in timings:
+            f.write(json.dumps(timing) + "\n")
+
+
+def test_build_seconds_per_app(tmp_path: Path):
+    bench = tmp_path / "bench"
+    timings = tmp_path / "timings.jsonl"
+    write_timings(
+        timings,
+        {"cwd": f"{bench}/apps/crm", "args": ["install"], "seconds": 30},
+        {"cwd": f"{bench}/apps/crm", "args": ["build"], "seconds": 4},
+        # Vite frontends build from a subfolder of the app
+        {"cwd": f"{bench}/apps/crm/frontend", "args": ["run", "build"], "seconds": 6},
+        {"cwd": f"{bench}/apps/drive", "args": ["build", "--prod"], "seconds": 2},
+        {"cwd": f"{bench}/apps/drive", "args": ["run", "lint"], "seconds": 9},
+    )
+    assert build_assets.get_build_seconds(str(timings), str(bench)) == {
+        "crm": 10,
+        "drive": 2,
+    }
+
+
+def test_build_seconds_without_yarn_builds(tmp_path: Path):
+    assert build_assets.get_build_seconds(str(tmp_path / "missing"), "/bench") == {}
+
+
+def test_output_size_counts_new_files(tmp_path: Path):
+    public = tmp_path / "public"
+    (public / "dist" / "js").mkdir(parents=True)
+    (public / "node_modules" / "pkg").mkdir(parents=True)
+    old = public / "dist" / "js" / "old.js"
+    old.write_text("x" * 100)
+    os.utime(old, (1000, 1000))
+    (public / "dist" / "js" / "app.bundle.js").write_text("x" * 10)
+    (public / "dist" / "js" / "app.bundle.js.map").write_text("x" * 5)
+    (public / "node_modules" / "pkg" / "index.js").write_text("x" * 1000)
+
+    assert build_assets.get_output_size(str(public), since=2000) == (2, 15)
+    assert build_assets.get_output_size(str(tmp_path / "missing"), since=0) == (0, 0)
+
+
+@pytest.mark.parametrize(
+    ("size", "growth"),
+    (
+        (1100 * 1024, []),
+        (1200 * 1024, ["crm: 1000KiB -> 1200KiB (+20%)"]),
+    ),
+)
+def test_compare_with_baseline(size: int, growth: list):
+    baseline = {"crm": {"bytes": 1000 * 1024}, "hrms": {"bytes": 0}}
+    reports = {
+        "crm": build_assets.AppReport(bytes=size),
+        # No baseline or an empty one: nothing to compare
+        "hrms": build_assets.AppReport(bytes=5000),
+        "drive": build_assets.AppReport(bytes=5000),
+    }
+    assert build_assets.compare(baseline, reports, threshold=0.1) == growth
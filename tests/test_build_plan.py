@@ -0,0 +1,78 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+SCRIPT = ROOT / "images" / "production" / "build_plan.py"
+FIXTURES = Path(__file__).parent / "fixtures"
+APPS_JSON = FIXTURES / "build_plan_apps.json"
+REFS = FIXTURES / "build_plan_refs.json"
+
+
+def get_keys(refs_file: Path) -> Dict[str, str]:
+    output = subprocess.check_output(
+        (
+            sys.executable,
+            str(SCRIPT),
+            "--dry-run",
+            f"--apps-json={APPS_JSON}",
+            f"--refs-file={refs_file}",
+        ),
+        encoding="UTF-8",
+    )
+    # <stage>  <commit>  <key>
+    return {line.split()[0]: line.split()[2] for line in output.splitlines()}
+
+
+def test_stages_from_apps_json():
+    keys = get_keys(REFS)
+    assert list(keys) == [
+        "src-frappe",
+        "src-erpnext",
+        "src-hrms",
+        "src-frappe_zakat",
+        "bench",
+        "node-erpnext",
+        "node-hrms",
+        "node-frappe_zakat",
+        "builder",
+        "erpnext",
+    ]
+    assert keys == get_keys(REFS)
+
+
+@pytest.mark.parametrize("app", ("hrms", "frappe_zakat"))
+def test_new_commit_changes_only_its_app(app: str, tmp_path: Path):
+    refs = json.loads(REFS.read_text())
+    url = next(url for url in refs if url.endswith(f"/{app.replace('_', '-')}.git"))
+    refs[url] = {branch: "f" * 40 for branch in refs[url]}
+    refs_file = tmp_path / "refs.json"
+    refs_file.write_text(json.dumps(refs))
+
+    before, after = get_keys(REFS), get_keys(refs_file)
+    changed = {stage for stage in before if before[stage] != after[stage]}
+    # Every stage after the merge of all apps depends on all of them
+    assert changed == {f"src-{app}", f"node-{app}", "builder", "erpnext"}
+
+
+def test_unresolved_branch_fails(tmp_path: Path):
+    refs_file = tmp_path / "refs.json"
+    refs_file.write_text("{}")
+    result = subprocess.run(
+        (
+            sys.executable,
+            str(SCRIPT),
+            "--dry-run",
+            f"--apps-json={APPS_JSON}",
+            f"--refs-file={refs_file}",
+        ),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        encoding="UTF-8",
+    )
+    assert result.returncode == 1
+    assert "Can't resolve commits" in result.stderr
@@ -1,11 +1,21 @@
+import http.client
+import json
 import os
+import subprocess
 from pathlib import Path
-from typing import Any
+from typing import Any, List
 
 import pytest
 
-from tests.conftest import S3ServiceResult
-from tests.utils import Compose, check_url_content
+from tests.conftest import S3ServiceResult, Stack
+from tests.utils import (
+    Compose,
+    DirectCompose,
+    check_url_content,
+    run_script_in_services,
+)
+
+pytestmark = pytest.mark.usefixtures("frappe_setup")
 
 BACKEND_SERVICES = (
     "backend",
@@ -15,11 +25,15 @@ BACKEND_SERVICES = (
 )
 
 
-@pytest.mark.parametrize("service", BACKEND_SERVICES)
-def test_links_in_backends(service: str, compose: Compose, python_path: str):
-    filename = "_check_connections.py"
-    compose("cp", f"tests/{filename}", f"{service}:/tmp/")
-    compose.exec(service, python_path, f"/tmp/{filename}")
+def test_links_in_backends(compose: DirectCompose, python_path: str):
+    run_script_in_services(
+        compose,
+        BACKEND_SERVICES,
+        "_check_connections.py",
+        python_path,
+        "-e",
+        "SOCKETIO_HOST=websocket",
+    )
 
 
 def index_cb(text: str):
@@ -81,40 +95,124 @@ def test_files_reachable(frappe_site: str, tmp_path: Path, compose: Compose):
     )
 
 
-@pytest.mark.parametrize("service", BACKEND_SERVICES)
 @pytest.mark.usefixtures("frappe_site")
-def test_frappe_connections_in_backends(
-    service: str, python_path: str, compose: Compose
-):
-    filename = "_ping_frappe_connections.py"
-    compose("cp", f"tests/{filename}", f"{service}:/tmp/")
-    compose.exec(
+def test_frappe_connections_in_backends(python_path: str, compose: DirectCompose):
+    run_script_in_services(
+        compose,
+        BACKEND_SERVICES,
+        "_ping_frappe_connections.py",
+        python_path,
         "-w",
         "/home/frappe/frappe-bench/sites",
-        service,
-        python_path,
-        f"/tmp/{filename}",
     )
 
 
-def test_push_backup(
-    frappe_site: str,
-    s3_service: S3ServiceResult,
-    compose: Compose,
-):
-    restic_password = "secret"
+def test_push_backup(frappe_site: str, restic_args: List[str], compose: Compose):
     compose.bench("--site", frappe_site, "backup", "--with-files")
-    restic_args = [
-        "--env=RESTIC_REPOSITORY=s3:http://minio:9000/frappe",
-        f"--env=AWS_ACCESS_KEY_ID={s3_service.access_key}",
-        f"--env=AWS_SECRET_ACCESS_KEY={s3_service.secret_key}",
-        f"--env=RESTIC_PASSWORD={restic_password}",
-    ]
     compose.exec(*restic_args, "backend", "restic", "init")
     compose.exec(*restic_args, "backend", "restic", "backup", "sites")
     compose.exec(*restic_args, "backend", "restic", "snapshots")
 
 
+def test_backup_sites(frappe_site: str, restic_args: List[str], compose: DirectCompose):
+    def restic(*args: str) -> str:
+        cmd = compose.exec_cmd(*restic_args, "backend", "restic", *args)
+        return subprocess.check_output(cmd, encoding="UTF-8")
+
+    restic("init")
+    # Earlier backups in the site folder must stay out of the snapshot
+    compose.bench("--site", frappe_site, "backup")
+    compose.exec(*restic_args, "backend", "backup_sites.py", "--jobs=2")
+
+    snapshots = json.loads(restic("snapshots", "--json", f"--tag=site:{frappe_site}"))
+    kinds = [tag for snapshot in snapshots for tag in snapshot["tags"]]
+    assert sorted(kind for kind in kinds if kind in ("database", "files")) == [
+        "database",
+        "files",
+    ]
+    files = restic("ls", "latest", f"--tag=site:{frappe_site},files")
+    assert f"/{frappe_site}/site_config.json" in files
+    assert "/private/backups/" not in files
+    dump = restic(
+        "dump",
+        "latest",
+        f"/{frappe_site}/database.sql",
+        f"--tag=site:{frappe_site},database",
+    )
+    assert "CREATE TABLE `tabDocType`" in dump
+
+
+def test_restore_sites(
+    restore_site: str, restic_args: List[str], compose: DirectCompose, tmp_path: Path
+):
+    def backend(*args: str) -> str:
+        cmd = compose.exec_cmd(*restic_args, "backend", *args)
+        return subprocess.check_output(cmd, encoding="UTF-8")
+
+    content = "restored\n"
+    file_path = tmp_path / "restored.txt"
+    file_path.write_text(content)
+    compose(
+        "cp",
+        str(file_path),
+        f"backend:/home/frappe/frappe-bench/sites/{restore_site}/public/files/",
+    )
+    backend("restic", "init")
+    backend("backup_sites.py", f"--site={restore_site}")
+    assert restore_site in backend("restore_sites.py", "--list")
+
+    # Lose the site completely, its database and its folder
+    site_config = json.loads(backend("cat", f"sites/{restore_site}/site_config.json"))
+    backend(
+        "mysql",
+        "--host=db",
+        "--user=root",
+        "--password=123",
+        f"--execute=DROP DATABASE `{site_config['db_name']}`",
+    )
+    backend("rm", "-rf", f"sites/{restore_site}")
+
+    backend(
+        "restore_sites.py",
+        f"--site={restore_site}",
+        "--db-root-password=123",
+        "--report=/tmp/restore.json",
+    )
+    (report,) = json.loads(backend("cat", "/tmp/restore.json"))
+    assert report["ok"], report["error"]
+    assert report["total"] > 0
+
+    check_url_content(
+        url="http://127.0.0.1/api/method/ping", callback=api_cb, site_name=restore_site
+    )
+    check_url_content(
+        url=f"http://127.0.0.1/files/{file_path.name}",
+        callback=lambda text: text if text == content else None,
+        site_name=restore_site,
+    )
+
+
+@pytest.mark.usefixtures("proxy_cache")
+def test_proxy_cache(frappe_site: str):
+    check_url_content(
+        url="http://127.0.0.1/login", callback=index_cb, site_name=frappe_site
+    )
+
+    def get_cache_status() -> str:
+        connection = http.client.HTTPConnection("127.0.0.1", timeout=10)
+        try:
+            connection.request("GET", "/login", headers={"Host": frappe_site})
+            response = connection.getresponse()
+            response.read()
+            assert response.getheader("Set-Cookie") is None
+            return response.getheader("X-Cache-Status", "")
+        finally:
+            connection.close()
+
+    get_cache_status()
+    assert get_cache_status() == "HIT"
+
+
 def test_https(frappe_site: str, compose: Compose):
     compose("-f", "overrides/compose.https.yaml", "up", "-d")
     check_url_content(url="https://127.0.0.1", callback=index_cb, site_name=frappe_site)
@@ -140,7 +238,7 @@ class TestErpnext:
 
 @pytest.mark.usefixtures("postgres_setup")
 class TestPostgres:
-    def test_site_creation(self, compose: Compose):
+    def test_site_creation(self, compose: Compose, stack: Stack):
         compose.bench(
             "new-site",
             "test-pg-site.localhost",
@@ -148,4 +246,5 @@ class TestPostgres:
             "postgres",
             "--admin-password",
             "admin",
+            *stack.new_site_args,
         )
@@ -0,0 +1,90 @@
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+SCRIPT = ROOT / ".github" / "scripts" / "get_latest_tags.py"
+REFS = Path(__file__).parent / "fixtures" / "latest_tags_refs.json"
+
+spec = importlib.util.spec_from_file_location("get_latest_tags", SCRIPT)
+get_latest_tags = importlib.util.module_from_spec(spec)
+sys.modules[spec.name] = get_latest_tags
+spec.loader.exec_module(get_latest_tags)
+
+
+def test_get_tags_from_refs_file():
+    tags = get_latest_tags.get_tags(["erpnext"], cache_file=None, refs_file=REFS)
+    assert list(tags) == ["erpnext"]
+    assert tags["erpnext"][-1] == "v16.0.0-beta.1"
+
+
+def test_get_tags_skips_cache(tmp_path: Path):
+    cache_file = tmp_path / "refs.json"
+    get_latest_tags.get_tags(["frappe"], cache_file=str(cache_file), refs_file=REFS)
+    assert not cache_file.exists()
+
+
+@pytest.mark.parametrize(
+    ("version", "frappe", "erpnext"),
+    (
+        ("14", "v14.10.1", "v14.21.0"),
+        # v15.10.0 sorts after v15.9.0, pre-releases before their release
+        ("15", "v15.10.1-beta.1", "v15.11.1"),
+        ("16", "v16.0.0-beta.10", "v16.0.0-beta.1"),
+        ("develop", "develop", "develop"),
+    ),
+)
+def test_get_matrix(version: str, frappe: str, erpnext: str):
+    matrix = get_latest_tags.get_matrix("erpnext", [version], refs_file=REFS)
+    assert matrix == [{"version": version, "frappe": frappe, "erpnext": erpnext}]
+
+
+def test_get_matrix_frappe_only():
+    matrix = get_latest_tags.get_matrix("frappe", ["14", "15"], refs_file=REFS)
+    assert matrix == [
+        {"version": "14", "frappe": "v14.10.1", "erpnext": None},
+        {"version": "15", "frappe": "v15.10.1-beta.1", "erpnext": None},
+    ]
+
+
+def test_get_matrix_missing_version():
+    with pytest.raises(RuntimeError, match="No tags found"):
+        get_latest_tags.get_matrix("frappe", ["13"], refs_file=REFS)
+
+
+def test_main_with_refs_fixture(tmp_path: Path):
+    github_env = tmp_path / "github_env"
+    env = {**os.environ, "REFS_FIXTURE": str(REFS), "GITHUB_ENV": str(github_env)}
+    output = subprocess.check_output(
+        (sys.executable, str(SCRIPT), "--repo", "erpnext", "--version", "15"),
+        env=env,
+        encoding="UTF-8",
+    )
+    assert json.loads(output) == {"frappe": "v15.10.1-beta.1", "erpnext": "v15.11.1"}
+    assert github_env.read_text() == (
+        "\nFRAPPE_VERSION=v15.10.1-beta.1\nERPNEXT_VERSION=v15.11.1"
+    )
+
+
+def test_main_matrix(tmp_path: Path):
+    output = subprocess.check_output(
+        (
+            sys.executable,
+            str(SCRIPT),
+            "--repo=frappe",
+            "--version",
+            "15",
+            "develop",
+            f"--refs-file={REFS}",
+        ),
+        encoding="UTF-8",
+    )
+    assert json.loads(output) == [
+        {"version": "15", "frappe": "v15.10.1-beta.1", "erpnext": None},
+        {"version": "develop", "frappe": "develop", "erpnext": None},
+    ]
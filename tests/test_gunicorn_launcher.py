@@ -0,0 +1,55 @@
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+RESOURCES = Path(__file__).parent.parent / "resources"
+# The scripts import their neighbours, like in /usr/local/bin
+sys.path.insert(0, str(RESOURCES))
+
+import gunicorn_launcher  # noqa: E402
+from resource_limits import Limits  # noqa: E402
+
+GIB = 1024**3
+
+
+@pytest.mark.parametrize(
+    ("limits", "workers", "threads"),
+    (
+        # No cgroup limits, same as the old compose command
+        (Limits(cpus=16, memory=64 * GIB), 2, 4),
+        (Limits(cpus=2, memory=4 * GIB, limited=True), 5, 4),
+        # Memory allows 2 of the 5 workers, threads make up for the other 3
+        (Limits(cpus=2, memory=GIB // 2, limited=True), 2, 8),
+        (Limits(cpus=4, memory=2 * GIB, limited=True), 8, 5),
+        (Limits(cpus=0.5, memory=128 * 1024**2, limited=True), 1, 8),
+    ),
+)
+def test_computed_config(limits: Limits, workers: int, threads: int):
+    config = gunicorn_launcher.get_config({}, limits)
+    assert (config.workers, config.threads) == (workers, threads)
+
+
+def test_threads_follow_overridden_workers():
+    limits = Limits(cpus=2, memory=4 * GIB, limited=True)
+    config = gunicorn_launcher.get_config({"GUNICORN_WORKERS": "1"}, limits)
+    assert (config.workers, config.threads) == (1, 8)
+    config = gunicorn_launcher.get_config(
+        {"GUNICORN_WORKERS": "1", "GUNICORN_THREADS": "2"}, limits
+    )
+    assert (config.workers, config.threads) == (1, 2)
+
+
+@pytest.mark.parametrize(
+    "env",
+    (
+        {"GUNICORN_WORKERS": "0"},
+        {"GUNICORN_WORKERS": "two"},
+        {"GUNICORN_THREADS": "0"},
+        {"GUNICORN_MAX_REQUESTS": "100", "GUNICORN_MAX_REQUESTS_JITTER": "100"},
+    ),
+)
+def test_invalid_config(env: Dict[str, str]):
+    with pytest.raises(gunicorn_launcher.ConfigError):
+        gunicorn_launcher.get_config(env, Limits(cpus=2, memory=4 * GIB))
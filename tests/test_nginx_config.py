@@ -0,0 +1,129 @@
+import re
+import sys
+from pathlib import Path
+from typing import Dict
+
+import pytest
+
+RESOURCES = Path(__file__).parent.parent / "resources"
+# The scripts import their neighbours, like in /usr/local/bin
+sys.path.insert(0, str(RESOURCES))
+
+import nginx_config  # noqa: E402
+from resource_limits import Limits  # noqa: E402
+
+LIMITS = Limits(cpus=2, memory=4 * 1024**3, limited=True)
+TEMPLATE = (RESOURCES / "nginx-template.conf").read_text()
+
+
+def get_settings(**env: str) -> Dict[str, str]:
+    return nginx_config.get_settings(
+        {"BACKEND": "backend:8000", "SOCKETIO": "websocket:9000", **env}, LIMITS
+    )
+
+
+def test_defaults():
+    settings = get_settings()
+    assert settings["BACKEND_SERVERS"] == "server backend:8000 fail_timeout=0;"
+    assert settings["UPSTREAM_KEEPALIVE_DIRECTIVE"] == "keepalive 16;"
+    assert settings["NGINX_WORKER_PROCESSES"] == "2"
+    assert settings["NGINX_WORKER_CONNECTIONS"] == "4096"
+
+
+def test_small_memory_defaults():
+    settings = nginx_config.get_settings({}, Limits(cpus=0.5, memory=256 * 1024**2))
+    assert settings["NGINX_WORKER_PROCESSES"] == "1"
+    assert settings["NGINX_WORKER_CONNECTIONS"] == "1024"
+    assert settings["OPEN_FILE_CACHE_MAX"] == "1000"
+
+
+@pytest.mark.parametrize(
+    "env",
+    (
+        {"PROXY_READ_TIMEOUT": "2 minutes"},
+        {"CLIENT_MAX_BODY_SIZE": "50mb"},
+        {"UPSTREAM_KEEPALIVE": "-1"},
+        {"PROXY_CACHE": "yes"},
+        {"BACKEND": "backend:8000,backend 2:8000"},
+        {"SOCKETIO": "websocket"},
+        {"NGINX_WORKER_PROCESSES": "0"},
+        # nginx refuses these buffer combinations
+        {"PROXY_BUFFERS": "1 256k"},
+        {"PROXY_BUSY_BUFFERS_SIZE": "1m"},
+        {"PROXY_BUFFER_SIZE": "512k"},
+    ),
+)
+def test_invalid_values(env: Dict[str, str]):
+    with pytest.raises(nginx_config.ConfigError):
+        get_settings(**env)
+
+
+def test_backend_replicas():
+    settings = get_settings(BACKEND="backend-1:8000, backend-2:8000")
+    assert settings["BACKEND_SERVERS"] == (
+        "server backend-1:8000 fail_timeout=0;\n\tserver backend-2:8000 fail_timeout=0;"
+    )
+
+
+def test_render_keeps_nginx_variables():
+    template = "server_name ${FRAPPE_SITE_NAME_HEADER};\nset $x ${UNKNOWN} $host;\n"
+    rendered = nginx_config.render(template, {"FRAPPE_SITE_NAME_HEADER": "$host"})
+    assert rendered == "server_name $host;\nset $x ${UNKNOWN} $host;\n"
+
+
+def test_render_drops_lines_of_empty_directives():
+    template = "upstream b {\n\t${SERVERS}\n\t${KEEPALIVE}\n}\nx ${KEEPALIVE} y\n"
+    rendered = nginx_config.render(
+        template, {"SERVERS": "server b:8000;", "KEEPALIVE": ""}
+    )
+    assert rendered == "upstream b {\n\tserver b:8000;\n}\nx  y\n"
+
+
+def test_render_template():
+    config = nginx_config.render(TEMPLATE, get_settings(UPSTREAM_KEEPALIVE="0"))
+    assert "${" not in config
+    assert "keepalive" not in config.split("server {")[0]
+    assert "proxy_cache" not in config
+    assert "\n\t\n" not in config
+
+
+def test_render_proxy_cache():
+    config = nginx_config.render(TEMPLATE, get_settings(PROXY_CACHE="on"))
+    assert "${" not in config
+    assert "keys_zone=frappe:10m" in config
+    webserver, cached = config.split("location @cached_webserver {")
+    assert "error_page 418 = @cached_webserver;" in webserver
+    assert "proxy_ignore_headers Cache-Control Expires Set-Cookie;" in cached
+    assert "proxy_hide_header Set-Cookie;" in cached
+    assert "$cookie_preferred_language|$http_accept_language" in cached
+    assert '"~^GET:(Guest)?::/(api|app)(/|$)" 0;' in config
+
+
+def test_render_nginx_conf():
+    content = (
+        "user www-data;\nworker_processes auto;\n"
+        "events {\n\tworker_connections 768;\n}\n"
+    )
+    settings = get_settings(NGINX_WORKER_PROCESSES="3", NGINX_WORKER_CONNECTIONS="512")
+    assert nginx_config.render_nginx_conf(content, settings) == (
+        "user www-data;\nworker_processes 3;\nevents {\n\tworker_connections 512;\n}\n"
+    )
+
+
+@pytest.mark.parametrize(
+    ("uri", "immutable"),
+    (
+        ("/assets/frappe/dist/js/desk.bundle.ABCD1234.js", True),
+        ("/assets/frappe/dist/css/website.bundle.ABCD1234.css.map", True),
+        ("/assets/helpdesk/frontend/assets/index-Bq3_x-9a.js", True),
+        ("/assets/helpdesk/frontend/assets/vendor-lib-DXmB8fQs.mjs", True),
+        ("/assets/frappe/js/lib-bundle22.js", False),
+        ("/assets/frappe/node_modules/lib/my-library.js", False),
+        ("/assets/helpdesk/frontend/index-Bq3x9a.js", False),
+        ("/assets/helpdesk/frontend/assets/index-Bq3_x-9a.png", False),
+    ),
+)
+def test_immutable_assets(uri: str, immutable: bool):
+    regex = re.search(r'location ~ "(.+)" \{\n\t+add_header Cache-Control', TEMPLATE)
+    assert regex
+    assert bool(re.search(regex.group(1), uri)) == immutable
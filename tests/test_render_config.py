@@ -0,0 +1,101 @@
+import importlib.util
+import os
+import shutil
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).parent.parent
+SCRIPT = ROOT / ".github" / "scripts" / "render_config.py"
+
+spec = importlib.util.spec_from_file_location("render_config", SCRIPT)
+render_config = importlib.util.module_from_spec(spec)
+# dataclasses look the module up by name
+sys.modules[spec.name] = render_config
+spec.loader.exec_module(render_config)
+
+
+@pytest.fixture
+def release_files(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    """Copies of example.env and pwd.yml, release_updates uses relative paths"""
+    shutil.copy(ROOT / "example.env", tmp_path / "example.env")
+    shutil.copy(ROOT / "pwd.yml", tmp_path / "pwd.yml")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_apply_updates_pwd_image_tags():
+    content = (
+        "services:\n"
+        "  backend:\n"
+        "    image: frappe/erpnext:v15.93.2\n"
+        "  db:\n"
+        "    image: mariadb:10.6\n"
+        "  frontend:\n"
+        "    image: frappe/erpnext:v15.93.2\n"
+    )
+    updates = render_config.release_updates("v99.0.0")
+    pwd_updates = [update for update in updates if update.path == "pwd.yml"]
+    assert render_config.apply_updates(content, pwd_updates) == (
+        "services:\n"
+        "  backend:\n"
+        "    image: frappe/erpnext:v99.0.0\n"
+        "  db:\n"
+        "    image: mariadb:10.6\n"
+        "  frontend:\n"
+        "    image: frappe/erpnext:v99.0.0\n"
+    )
+
+
+def test_apply_updates_env_version():
+    content = "# Comment\n\nERPNEXT_VERSION=v15.93.2\n\nDB_PASSWORD=123\n"
+    update = render_config.env_var("example.env", "ERPNEXT_VERSION", "v99.0.0")
+    assert render_config.apply_updates(content, [update]) == (
+        "# Comment\n\nERPNEXT_VERSION=v99.0.0\n\nDB_PASSWORD=123\n"
+    )
+
+
+def test_apply_updates_appends_missing_env_var():
+    update = render_config.env_var(".env", "SITES", "`a.localhost`")
+    assert render_config.apply_updates("DB_PASSWORD=123", [update]) == (
+        "DB_PASSWORD=123\nSITES=`a.localhost`"
+    )
+
+
+def test_render_check_finds_drift(release_files: Path):
+    before = {path: path.read_text() for path in release_files.iterdir()}
+    changed = render_config.render(
+        render_config.release_updates("v99.0.0"), check=True
+    )
+    assert changed == ["example.env", "pwd.yml"]
+    # Nothing is written in check mode
+    assert {path: path.read_text() for path in release_files.iterdir()} == before
+
+
+def test_render_writes_once_up_to_date(release_files: Path):
+    updates = render_config.release_updates("v99.0.0")
+    assert render_config.render(updates) == ["example.env", "pwd.yml"]
+    assert "ERPNEXT_VERSION=v99.0.0\n" in (release_files / "example.env").read_text()
+    pwd = (release_files / "pwd.yml").read_text()
+    assert "frappe/erpnext:v99.0.0" in pwd
+    assert "frappe/erpnext:v15.93.2" not in pwd
+    assert render_config.render(updates, check=True) == []
+
+
+def test_main_check_exit_code(release_files: Path):
+    def run(*args: str) -> subprocess.CompletedProcess:
+        return subprocess.run(
+            (sys.executable, str(SCRIPT), *args),
+            env={**os.environ, "ERPNEXT_VERSION": "v99.0.0"},
+            cwd=release_files,
+            stdout=subprocess.PIPE,
+            encoding="UTF-8",
+        )
+
+    result = run("--check")
+    assert result.returncode == 1
+    assert result.stdout.splitlines() == ["Outdated: example.env", "Outdated: pwd.yml"]
+    assert run().returncode == 0
+    assert run("--check").returncode == 0
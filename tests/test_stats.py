@@ -0,0 +1,21 @@
+import pytest
+
+from tests._stats import percentile
+
+
+@pytest.mark.parametrize(
+    ("values", "pct", "expected"),
+    (
+        (list(range(1, 101)), 50, 50),
+        (list(range(1, 101)), 95, 95),
+        (list(range(1, 101)), 99, 99),
+        (list(range(1, 101)), 100, 100),
+        ([1, 2, 3, 4], 50, 2),
+        ([1, 2, 3, 4], 75, 3),
+        ([7], 99, 7),
+        ([1, 2], 0, 1),
+        ([], 95, 0.0),
+    ),
+)
+def test_nearest_rank(values, pct, expected):
+    assert percentile(values, pct) == expected
@@ -0,0 +1,154 @@
+import fnmatch
+import json
+import queue
+import signal
+import socketserver
+import subprocess
+import sys
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator
+
+import pytest
+
+SCRIPT = Path(__file__).parent.parent / "resources" / "worker_supervisor.py"
+# Exits on SIGTERM like an idle RQ worker
+WORKER = (
+    "import signal, sys, time; "
+    "signal.signal(signal.SIGTERM, lambda *_: sys.exit(0)); "
+    "time.sleep(60)"
+)
+
+
+class RedisStandIn(socketserver.ThreadingTCPServer):
+    """
+    Answers the few commands the supervisor sends, queue lengths come from `queues`.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), RedisHandler)
+        self.queues: Dict[str, int] = {}
+
+
+class RedisHandler(socketserver.StreamRequestHandler):
+    server: RedisStandIn
+
+    def read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2].decode())
+        return args
+
+    def write_bulk(self, value: str) -> bytes:
+        return b"$%d\r\n%s\r\n" % (len(value), value.encode())
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = args[0].upper()
+            if command == "SCAN":
+                keys = fnmatch.filter(self.server.queues, args[3])
+                reply = b"*2\r\n" + self.write_bulk("0") + b"*%d\r\n" % len(keys)
+                reply += b"".join(self.write_bulk(key) for key in keys)
+            elif command == "LLEN":
+                reply = b":%d\r\n" % self.server.queues.get(args[1], 0)
+            else:
+                reply = b"+OK\r\n"
+            self.wfile.write(reply)
+
+
+@pytest.fixture
+def redis_stand_in() -> Iterator[RedisStandIn]:
+    server = RedisStandIn()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+class Events:
+    def __init__(self, proc: subprocess.Popen):
+        self.queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self.seen = []
+        threading.Thread(target=self.read, args=(proc,), daemon=True).start()
+
+    def read(self, proc: subprocess.Popen):
+        assert proc.stdout
+        for line in proc.stdout:
+            self.queue.put(json.loads(line))
+
+    def wait_for(self, predicate: Callable[[Dict[str, Any]], bool], timeout=10):
+        while True:
+            event = self.queue.get(timeout=timeout)
+            self.seen.append(event)
+            if predicate(event):
+                return event
+
+
+def test_worker_supervisor_scales_with_queue_depth(
+    redis_stand_in: RedisStandIn, tmp_path: Path
+):
+    host, port = redis_stand_in.server_address
+    redis_stand_in.queues["rq:queue:frappe-bench:long"] = 0
+    metrics_file = tmp_path / "metrics.prom"
+    proc = subprocess.Popen(
+        (
+            sys.executable,
+            str(SCRIPT),
+            "--queue=long,default",
+            "--min=1",
+            "--max=4",
+            "--jobs-per-worker=10",
+            "--interval=0.1",
+            "--scale-down-delay=0.5",
+            "--drain-timeout=5",
+            f"--redis-url=redis://{host}:{port}",
+            f"--bench-path={tmp_path}",
+            f"--metrics-file={metrics_file}",
+            "--",
+            sys.executable,
+            "-c",
+            WORKER,
+        ),
+        stdout=subprocess.PIPE,
+        text=True,
+    )
+    events = Events(proc)
+    try:
+        events.wait_for(lambda e: e["event"] == "start")
+
+        redis_stand_in.queues["rq:queue:frappe-bench:long"] = 25
+        event = events.wait_for(lambda e: e["event"] == "scale")
+        assert event["direction"] == "up"
+        assert event["workers"] == 3
+        assert event["depth"] == 25
+
+        redis_stand_in.queues["rq:queue:frappe-bench:long"] = 1000
+        event = events.wait_for(lambda e: e["event"] == "scale")
+        assert event["workers"] == 4, "Should stay within --max"
+
+        redis_stand_in.queues["rq:queue:frappe-bench:long"] = 0
+        event = events.wait_for(lambda e: e["event"] == "scale")
+        assert event["direction"] == "down"
+        assert event["workers"] == 1
+        for _ in range(3):
+            event = events.wait_for(lambda e: e["event"] == "drained")
+            assert event["returncode"] == 0
+
+        metrics = metrics_file.read_text()
+        assert 'frappe_worker_queue_depth{queue="long"} 0' in metrics
+        assert 'direction="up"} 2' in metrics
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        assert proc.wait(timeout=10) == 0
+    events.wait_for(lambda e: e["event"] == "drained")
@@ -1,12 +1,14 @@
+import asyncio
+import http.client
 import os
+import random
 import ssl
 import subprocess
 import sys
 import time
 from contextlib import suppress
-from typing import Callable, Optional
-from urllib.error import HTTPError, URLError
-from urllib.request import Request, urlopen
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+from urllib.parse import urljoin, urlsplit
 
 CI = os.getenv("CI")
 
@@ -22,8 +24,6 @@ class Compose:
             "--env-file",
             env_file,
         )
-
-    def __call__(self, *cmd: str) -> None:
         file_args = [
             "-f",
             "compose.yaml",
@@ -36,8 +36,10 @@ class Compose:
         ]
         if CI:
             file_args += ("-f", "tests/compose.ci.yaml")
+        self.file_args = tuple(file_args)
 
-        args = self.base_cmd + tuple(file_args) + cmd
+    def __call__(self, *cmd: str) -> None:
+        args = self.base_cmd + self.file_args + cmd
         subprocess.check_call(args)
 
     def exec(self, *cmd: str) -> None:
@@ -56,34 +58,302 @@ class Compose:
         self.exec("backend", "bench", *cmd)
 
 
-def check_url_content(
-    url: str, callback: Callable[[str], Optional[str]], site_name: str
-):
-    request = Request(url, headers={"Host": site_name})
+# `docker compose exec` options that are followed by a value
+EXEC_OPTIONS_WITH_VALUE = ("-e", "--env", "-w", "--workdir", "-u", "--user")
+
+
+def split_exec_args(cmd: Tuple[str, ...]) -> Tuple[List[str], str, List[str]]:
+    options: List[str] = []
+    args = iter(cmd)
+    for arg in args:
+        if arg in EXEC_OPTIONS_WITH_VALUE:
+            options += (arg, next(args))
+        elif arg == "-T":
+            # `docker exec` doesn't allocate a TTY by default
+            continue
+        elif arg.startswith("-"):
+            options.append(arg)
+        else:
+            return options, arg, list(args)
+    raise ValueError(f"No service in exec command: {cmd}")
+
+
+async def run_async(*cmd: str) -> str:
+    process = await asyncio.create_subprocess_exec(
+        *cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT
+    )
+    stdout, _ = await process.communicate()
+    output = stdout.decode()
+    if process.returncode:
+        raise subprocess.CalledProcessError(process.returncode, cmd, output=output)
+    return output
+
+
+class DirectCompose(Compose):
+    """
+    Runs `cp` and `exec` with plain `docker` against cached container IDs,
+    skipping compose file parsing. Other commands go through `docker compose`
+    and reset the cache since they may recreate containers.
+    """
+
+    def __init__(self, project_name: str, env_file: str):
+        super().__init__(project_name=project_name, env_file=env_file)
+        self._containers: Optional[Dict[str, str]] = None
+
+    def __call__(self, *cmd: str) -> None:
+        if cmd and cmd[0] == "cp":
+            return self.cp(*cmd[1:])
+        if cmd and cmd[0] == "exec":
+            return self.exec(*cmd[1:])
+        self._containers = None
+        super().__call__(*cmd)
+
+    @property
+    def containers(self) -> Dict[str, str]:
+        if self._containers is None:
+            output = subprocess.check_output(
+                (
+                    "docker",
+                    "ps",
+                    "--filter",
+                    f"label=com.docker.compose.project={self.project_name}",
+                    "--format",
+                    '{{.Label "com.docker.compose.service"}} {{.ID}}',
+                ),
+                encoding="UTF-8",
+            )
+            self._containers = dict(line.split() for line in output.splitlines())
+        return self._containers
+
+    def _container_path(self, path: str) -> str:
+        service, sep, container_path = path.partition(":")
+        if sep and service in self.containers:
+            return f"{self.containers[service]}:{container_path}"
+        return path
+
+    def cp_cmd(self, src: str, dest: str) -> Tuple[str, ...]:
+        return ("docker", "cp", self._container_path(src), self._container_path(dest))
+
+    def exec_cmd(self, *cmd: str) -> Tuple[str, ...]:
+        options, service, args = split_exec_args(cmd)
+        return ("docker", "exec", *options, self.containers[service], *args)
+
+    def cp(self, src: str, dest: str) -> None:
+        subprocess.check_call(self.cp_cmd(src, dest))
+
+    def exec(self, *cmd: str) -> None:
+        subprocess.check_call(self.exec_cmd(*cmd))
+
+    def stop(self) -> None:
+        self._containers = None
+        super().stop()
+
+    async def cp_async(self, src: str, dest: str) -> str:
+        return await run_async(*self.cp_cmd(src, dest))
+
+    async def exec_async(self, *cmd: str) -> str:
+        return await run_async(*self.exec_cmd(*cmd))
+
+    async def bench_async(self, *cmd: str) -> str:
+        return await self.exec_async("backend", "bench", *cmd)
+
 
+# Imported by the scripts, copied next to them
+SHARED_SCRIPT_MODULES = ("_stats.py",)
+
+
+async def _run_script_in_service(
+    compose: DirectCompose,
+    service: str,
+    filename: str,
+    python_path: str,
+    exec_options: Tuple[str, ...],
+    script_args: Tuple[str, ...],
+) -> Tuple[float, str]:
+    start = time.monotonic()
+    for name in (filename, *SHARED_SCRIPT_MODULES):
+        await compose.cp_async(f"tests/{name}", f"{service}:/tmp/")
+    output = await compose.exec_async(
+        *exec_options, service, python_path, f"/tmp/{filename}", *script_args
+    )
+    return time.monotonic() - start, output
+
+
+def run_script_in_services(
+    compose: DirectCompose,
+    services: Tuple[str, ...],
+    filename: str,
+    python_path: str,
+    *exec_options: str,
+    script_args: Tuple[str, ...] = (),
+) -> Dict[str, float]:
+    """
+    Copies tests/{filename} into every service and runs it concurrently.
+    Returns run time per service, raises if any service failed.
+    """
+
+    async def run_all():
+        return await asyncio.gather(
+            *(
+                _run_script_in_service(
+                    compose, service, filename, python_path, exec_options, script_args
+                )
+                for service in services
+            ),
+            return_exceptions=True,
+        )
+
+    timings: Dict[str, float] = {}
+    failures: Dict[str, BaseException] = {}
+    for service, result in zip(services, asyncio.run(run_all())):
+        if isinstance(result, BaseException):
+            failures[service] = result
+            output = getattr(result, "output", None) or repr(result)
+            print(f"{service}: {filename} failed\n{output}")
+        else:
+            timings[service], output = result
+            print(f"{service}: {filename} passed in {timings[service]:.2f}s\n{output}")
+
+    if failures:
+        raise RuntimeError(f"{filename} failed in {', '.join(failures)}")
+    return timings
+
+
+# Seconds to wait for an endpoint of a site that never answered yet
+READY_TIMEOUT = float(os.getenv("READY_TIMEOUT", "120"))
+# Seconds to wait for an endpoint of a site that already answered
+READY_SITE_TIMEOUT = float(os.getenv("READY_SITE_TIMEOUT", "10"))
+
+RETRY_STATUSES = (404, 502, 503, 504)
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+def get_ssl_context() -> ssl.SSLContext:
     # This is needed to check https override
     ctx = ssl.create_default_context()
     ctx.check_hostname = False
     ctx.verify_mode = ssl.CERT_NONE
+    return ctx
+
 
-    for _ in range(100):
-        try:
-            response = urlopen(request, context=ctx)
+Connection = Union[http.client.HTTPConnection, http.client.HTTPSConnection]
 
-        except HTTPError as exc:
-            if exc.code not in (404, 502):
+
+class Readiness:
+    """
+    Waits for endpoints with exponential backoff and jitter over reused
+    connections. Sites that answered once get a shorter deadline.
+    """
+
+    def __init__(
+        self,
+        timeout: float = READY_TIMEOUT,
+        site_timeout: float = READY_SITE_TIMEOUT,
+        initial_delay: float = 0.1,
+        max_delay: float = 5.0,
+    ):
+        self.timeout = timeout
+        self.site_timeout = site_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.ready_sites: Set[Tuple[str, str, str]] = set()
+        self.time_to_ready: Dict[Tuple[str, str], float] = {}
+        self._connections: Dict[Tuple[str, str], Connection] = {}
+
+        self._ssl_context = get_ssl_context()
+
+    def _connection(self, scheme: str, netloc: str) -> Connection:
+        key = (scheme, netloc)
+        if key not in self._connections:
+            if scheme == "https":
+                self._connections[key] = http.client.HTTPSConnection(
+                    netloc, timeout=10, context=self._ssl_context
+                )
+            else:
+                self._connections[key] = http.client.HTTPConnection(netloc, timeout=10)
+        return self._connections[key]
+
+    def _drop_connection(self, scheme: str, netloc: str) -> None:
+        connection = self._connections.pop((scheme, netloc), None)
+        if connection:
+            connection.close()
+
+    def get(self, url: str, site_name: str) -> Tuple[int, str]:
+        for _ in range(5):
+            parts = urlsplit(url)
+            path = parts.path or "/"
+            if parts.query:
+                path += f"?{parts.query}"
+            connection = self._connection(parts.scheme, parts.netloc)
+            try:
+                connection.request("GET", path, headers={"Host": site_name})
+                response = connection.getresponse()
+                text = response.read().decode()
+            except (OSError, http.client.HTTPException):
+                self._drop_connection(parts.scheme, parts.netloc)
                 raise
+            location = response.getheader("Location")
+            if response.status not in REDIRECT_STATUSES or not location:
+                return response.status, text
+            url = urljoin(url, location)
+        raise RuntimeError(f"Too many redirects for {url}")
 
-        except URLError:
-            pass
+    def _delay(self, attempt: int) -> float:
+        delay = min(self.max_delay, self.initial_delay * 2**attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
 
-        else:
-            text: str = response.read().decode()
-            ret = callback(text)
-            if ret:
-                print(ret)
-                return
+    def wait(
+        self,
+        url: str,
+        callback: Callable[[str], Optional[str]],
+        site_name: str,
+        timeout: Optional[float] = None,
+    ) -> float:
+        parts = urlsplit(url)
+        site_key = (parts.scheme, parts.netloc, site_name)
+        if timeout is None:
+            if site_key in self.ready_sites:
+                timeout = self.site_timeout
+            else:
+                timeout = self.timeout
 
-        time.sleep(0.1)
+        start = time.monotonic()
+        deadline = start + timeout
+        attempt = 0
+        while True:
+            try:
+                status, text = self.get(url, site_name)
+            except (OSError, http.client.HTTPException):
+                pass
+            else:
+                if status >= 400 and status not in RETRY_STATUSES:
+                    raise RuntimeError(f"{url} returned {status}: {text[:200]}")
+                if status < 400:
+                    ret = callback(text)
+                    if ret:
+                        print(ret)
+                        break
 
-    raise RuntimeError(f"Couldn't ping {url}")
+            delay = self._delay(attempt)
+            if time.monotonic() + delay > deadline:
+                raise RuntimeError(f"Couldn't ping {url} in {timeout}s")
+            time.sleep(delay)
+            attempt += 1
+
+        elapsed = time.monotonic() - start
+        self.ready_sites.add(site_key)
+        self.time_to_ready[(site_name, url)] = elapsed
+        print(f"{url} ({site_name}) ready in {elapsed:.2f}s after {attempt + 1} tries")
+        return elapsed
+
+
+readiness = Readiness()
+
+
+def check_url_content(
+    url: str,
+    callback: Callable[[str], Optional[str]],
+    site_name: str,
+    timeout: Optional[float] = None,
+):
+    readiness.wait(url, callback, site_name, timeout=timeout)